@@ -0,0 +1 @@
+"""Micro-benchmarks for tap-aircall."""
@@ -0,0 +1,77 @@
+"""Per-record cost of conforming calls to the stream schema.
+
+Compares the SDK path (`pop_deselected_record_properties` walking the
+selection mask through every nested object, then
+`conform_record_data_types`) with the conformer compiled for the stream,
+alone and with one in 100 or every record validated, next to the validation
+of every record by `jsonschema`. Calls are post-processed outside of the
+timed sections. Run with ``poetry run python -m benchmarks.bench_conform``.
+"""
+
+import copy
+import time
+
+from jsonschema import Draft7Validator
+from singer_sdk.helpers._catalog import pop_deselected_record_properties
+from singer_sdk.helpers._typing import conform_record_data_types
+
+from tap_aircall.conform import compile_conformer, compile_validator
+from tap_aircall.schemas import call_properties
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.fixtures import RecordFactory
+
+CALLS = 20000
+
+
+def sdk(stream, rows: list) -> None:
+    """Conform like `Stream._generate_record_messages` of the SDK."""
+    for row in rows:
+        pop_deselected_record_properties(row, stream.schema, stream.mask, stream.logger)
+        conform_record_data_types(stream.name, row, stream.schema, stream.logger)
+
+
+def compiled(stream, rows: list, validate_every: int = 0) -> None:
+    """Conform with the compiled conformer, validating one in `validate_every`."""
+    conform = compile_conformer(stream.name, stream.schema, stream.logger)
+    validate = compile_validator(stream.schema)
+    for index, row in enumerate(rows):
+        record = conform(row)
+        if validate_every and index % validate_every == 0:
+            validate(record)
+
+
+def jsonschema(stream, rows: list) -> None:
+    """Validate every record with the generic `jsonschema` validator."""
+    validator = Draft7Validator(stream.schema)
+    for row in rows:
+        for _ in validator.iter_errors(row):
+            pass
+
+
+def main() -> None:
+    """Print the per-call cost of each path."""
+    stream = Tapaircall(
+        config={"api_id": "id", "api_token": "token"}, parse_env_config=False
+    ).streams["calls"]
+    factory = RecordFactory(call_properties.to_dict())
+    records = [
+        stream.post_process(copy.deepcopy(factory.record(i)), None)
+        for i in range(CALLS)
+    ]
+    runs = [
+        ("sdk", lambda rows: sdk(stream, rows)),
+        ("compiled", lambda rows: compiled(stream, rows)),
+        ("1/100", lambda rows: compiled(stream, rows, 100)),
+        ("1/1", lambda rows: compiled(stream, rows, 1)),
+        ("jsonschema", lambda rows: jsonschema(stream, rows)),
+    ]
+    for name, conform in runs:
+        rows = copy.deepcopy(records)
+        started = time.perf_counter()
+        conform(rows)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>10}: {elapsed / CALLS * 1e6:7.2f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""End-to-end throughput of the tap against the local mock API.
+
+Starts the mock API (``tap_aircall.tests.mock_api``) and the tap in separate
+processes, reads the Singer messages from the tap's stdout and reports
+records/sec, requests/sec, peak RSS of the tap and time to first record.
+Records written to batch files (``--config batch_dir=...``) are counted from
+the files announced by BATCH messages, once the tap has exited. Run with
+``poetry run python -m benchmarks.bench_e2e --calls 20000``; any extra
+``--config KEY=VALUE`` is added to the tap config.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+TAP_COMMAND = [
+    sys.executable, "-c", "from tap_aircall.tap import Tapaircall; Tapaircall.cli()"
+]
+
+
+def _config_value(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Sync once and return the measurements."""
+    mock = subprocess.Popen(
+        [
+            sys.executable, "-m", "tap_aircall.tests.mock_api",
+            "--port", "0", "--calls", str(args.calls), "--users", str(args.users),
+            "--latency", str(args.latency),
+            "--requests-per-minute", "1000000",
+            "--throttle-every", str(args.throttle_every),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        url = mock.stdout.readline().strip()
+        config = {
+            "api_id": "id",
+            "api_token": "token",
+            "start_date": "2020-01-01T00:00:00Z",
+            "api_url": url,
+            "requests_per_minute": 1000000,
+        }
+        config.update(
+            (key, _config_value(value))
+            for key, value in (item.split("=", 1) for item in args.config)
+        )
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as config_file:
+            json.dump(config, config_file)
+            config_file.flush()
+
+            started = time.perf_counter()
+            first_record = None
+            records = 0
+            stdout_bytes = 0
+            batch_files: List[str] = []
+            tap = subprocess.Popen(
+                TAP_COMMAND + ["--config", config_file.name],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+            for line in tap.stdout:
+                stdout_bytes += len(line)
+                if b'"RECORD"' in line[:40]:
+                    records += 1
+                    if first_record is None:
+                        first_record = time.perf_counter() - started
+                elif b'"BATCH"' in line[:40]:
+                    batch_files += json.loads(line)["manifest"]
+                    if first_record is None:
+                        first_record = time.perf_counter() - started
+            _, status, rusage = os.wait4(tap.pid, 0)
+            elapsed = time.perf_counter() - started
+            if status:
+                raise RuntimeError(f"The tap exited with status {status}.")
+
+        for batch_file in batch_files:
+            with gzip.open(urlparse(batch_file).path) as lines:
+                records += sum(1 for _ in lines)
+
+        with urlopen(f"{url}__stats") as response:
+            stats = json.load(response)
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    return {
+        "records": records,
+        "seconds": round(elapsed, 3),
+        "records_per_second": round(records / elapsed, 1),
+        "requests": stats["requests"],
+        "requests_per_second": round(stats["requests"] / elapsed, 1),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+        "stdout_mb": round(stdout_bytes / 1024 / 1024, 1),
+        "time_to_first_record": round(first_record or 0, 3),
+    }
+
+
+def main() -> None:
+    """Parse the arguments and print the measurements as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--config", action="append", default=[])
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-page decode and JSONPath cost, before and after the payload cache.
+
+Also compares the peak memory of a whole-page decode with the streamed,
+record-by-record decode of `stream_json`.
+
+Run with ``poetry run python -m benchmarks.bench_page_decode``.
+"""
+
+import json
+import timeit
+import tracemalloc
+
+import requests
+from singer_sdk.helpers.jsonpath import extract_jsonpath
+
+from tap_aircall.jsonstream import iter_json_records
+from tap_aircall.tests.fixtures import calls_page_bytes
+
+PAGES = 200
+
+
+def _response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response.encoding = "utf-8"
+    return response
+
+
+def legacy(body: bytes) -> int:
+    """Three decodes and three JSONPath walks, as `aircallStream` used to do."""
+    response = _response(body)
+    next(iter(extract_jsonpath("$.meta.next_page_link", response.json())), None)
+    list(extract_jsonpath("$.meta.[*]", input=response.json()))
+    return sum(1 for _ in extract_jsonpath("$.calls[*]", input=response.json()))
+
+
+def cached(body: bytes) -> int:
+    """One decode shared by records, pagination and the meta log line."""
+    payload = json.loads(body)
+    meta = payload.get("meta") or {}
+    meta.get("next_page_link")
+    list(meta.values())
+    return sum(1 for _ in payload.get("calls") or [])
+
+
+def streamed(body: bytes) -> int:
+    """Records decoded one at a time from 64 KiB chunks of the body."""
+    chunks = (body[i:i + 65536] for i in range(0, len(body), 65536))
+    meta: dict = {}
+    count = sum(1 for _ in iter_json_records(chunks, "calls", meta.__setitem__))
+    meta["meta"].get("next_page_link")
+    return count
+
+
+def main() -> None:
+    """Print the per-page cost and peak memory of each strategy."""
+    body = calls_page_bytes(per_page=50)
+    print(f"page size: {len(body) / 1024:.1f} KiB, {PAGES} pages")
+    for fn in (legacy, cached, streamed):
+        seconds = timeit.timeit(lambda: fn(body), number=PAGES)
+        tracemalloc.start()
+        fn(body)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"{fn.__name__:>8}: {seconds / PAGES * 1000:.2f} ms/page, "
+            f"peak {peak / 1024:.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Requests and wall-clock time per 10k calls at different page sizes.
+
+Runs the calls stream against the local mock API, which adds `LATENCY`
+seconds to every response to stand in for the round trip to Aircall.
+Run with ``poetry run python -m benchmarks.bench_page_size``.
+"""
+
+import logging
+import time
+
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+RECORDS = 10000
+LATENCY = 0.05
+PAGE_SIZES = (10, 20, 50)
+
+
+def run(page_size: int) -> None:
+    """Sync `RECORDS` calls with the given page size and print the cost."""
+    with MockAircallAPI(
+        total_calls=RECORDS, latency=LATENCY, requests_per_minute=1000000
+    ) as api:
+        tap = Tapaircall(
+            config={
+                "api_id": "id",
+                "api_token": "token",
+                "start_date": "2020-01-01T00:00:00Z",
+                "api_url": api.url,
+                "page_size": page_size,
+                "requests_per_minute": 1000000,
+            },
+            parse_env_config=False,
+        )
+        stream = tap.streams["calls"]
+        stream._write_starting_replication_value(None)
+        started = time.perf_counter()
+        count = sum(1 for _ in stream.get_records(None))
+        elapsed = time.perf_counter() - started
+
+    # What the same number of requests costs under the real 60 req/min budget.
+    budget_minutes = len(api.requests) / 60
+    print(
+        f"per_page={page_size:>3}: {count} records, {len(api.requests):>4} requests, "
+        f"{elapsed:6.2f}s locally, >= {budget_minutes:5.1f} min at 60 req/min"
+    )
+
+
+def main() -> None:
+    """Compare every page size."""
+    logging.disable(logging.INFO)
+    for page_size in PAGE_SIZES:
+        run(page_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Timestamp conversion cost over a synthetic 1M-call dataset.
+
+Compares the former `post_process` (local-time `datetime` objects for three
+keys, serialized later by the SDK) with the schema-driven conversion
+straight to ISO-8601 UTC strings. Calls are generated in chunks, outside of
+the timed sections. Run with ``poetry run python -m benchmarks.bench_post_process``.
+"""
+
+import time
+from datetime import datetime
+
+from tap_aircall.client import apply_datetime_plan, compile_datetime_plan
+from tap_aircall.schemas import call_properties
+from tap_aircall.tests.fixtures import EPOCH
+
+CALLS = 1000000
+CHUNK = 100000
+
+
+def _calls(first: int) -> list:
+    """Return the date-time bearing part of `CHUNK` calls."""
+    return [
+        {
+            "id": call_id,
+            "started_at": EPOCH + call_id,
+            "answered_at": EPOCH + call_id + 5,
+            "ended_at": EPOCH + call_id + 125,
+            "user": {"id": 1, "created_at": "2020-06-01T09:00:00.000Z"},
+            "comments": [{"id": call_id, "posted_at": EPOCH + call_id + 200}],
+        }
+        for call_id in range(first, first + CHUNK)
+    ]
+
+
+def legacy(rows: list) -> None:
+    """Convert like the former `post_process`, then serialize like the SDK."""
+    for row in rows:
+        datetime_types = ["answered_at", "started_at", "ended_at"]
+        for key in datetime_types:
+            if key in row and row.get(key):
+                row[key] = datetime.fromtimestamp(row.get(key))
+        for key in datetime_types:
+            row[key] = row[key].isoformat()
+
+
+def planned(rows: list) -> None:
+    """Convert every date-time of the schema straight to ISO strings."""
+    plan = compile_datetime_plan(call_properties.to_dict())
+    for row in rows:
+        apply_datetime_plan(row, plan)
+
+
+def main() -> None:
+    """Print the per-call cost of both conversions."""
+    for convert in (legacy, planned):
+        elapsed = 0.0
+        for first in range(0, CALLS, CHUNK):
+            rows = _calls(first)
+            started = time.perf_counter()
+            convert(rows)
+            elapsed += time.perf_counter() - started
+        print(
+            f"{convert.__name__:>7}: {elapsed:5.2f}s for {CALLS} calls, "
+            f"{elapsed / CALLS * 1e6:.2f} us/call"
+        )
+
+
+if __name__ == "__main__":
+    main()
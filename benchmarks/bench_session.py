@@ -0,0 +1,63 @@
+"""Per-page latency and TLS handshakes, fresh connections vs the pooled session.
+
+Serves the mock API over HTTPS with a throwaway self-signed certificate
+(requires the ``openssl`` command). Run with
+``poetry run python -m benchmarks.bench_session``.
+"""
+
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+PAGES = 200
+
+
+def _certificate(directory: Path) -> tuple:
+    certfile, keyfile = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", str(keyfile), "-out", str(certfile), "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return str(certfile), str(keyfile)
+
+
+def _run(label: str, tls: tuple, get) -> None:
+    with MockAircallAPI(total_users=10, tls=tls) as api:
+        url = f"{api.url}v1/users"
+        started = time.perf_counter()
+        for _ in range(PAGES):
+            get(url).raise_for_status()
+        elapsed = time.perf_counter() - started
+    print(
+        f"{label:>14}: {elapsed / PAGES * 1000:6.2f} ms/page, "
+        f"{api.connections} TCP/TLS handshakes for {PAGES} pages"
+    )
+
+
+def main() -> None:
+    """Compare a new connection per page with the tap's shared session."""
+    with tempfile.TemporaryDirectory() as directory:
+        tls = _certificate(Path(directory))
+        certfile = tls[0]
+        _run("new connection", tls, lambda url: requests.get(
+            url, verify=certfile, headers={"Connection": "close"}
+        ))
+        session = Tapaircall(
+            config={"api_id": "id", "api_token": "token"}, parse_env_config=False
+        ).requests_session
+        _run("pooled session", tls, lambda url: session.get(url, verify=certfile))
+
+
+if __name__ == "__main__":
+    main()
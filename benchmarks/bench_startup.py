@@ -0,0 +1,52 @@
+"""Start-up cost of the tap: imports, `--version` and stream discovery.
+
+Each case runs in a fresh interpreter. Run with
+``poetry run python -m benchmarks.bench_startup``.
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 10
+
+CASES = {
+    "python": "pass",
+    "import tap": "import tap_aircall.tap",
+    "--version (Tapaircall.cli)": (
+        "from tap_aircall.tap import Tapaircall; "
+        "Tapaircall.cli(['--version'], standalone_mode=False)"
+    ),
+    "--version (tap_aircall.cli)": (
+        "from tap_aircall.cli import main; main(['--version'])"
+    ),
+    "discover streams": (
+        "from tap_aircall.tap import Tapaircall; "
+        "Tapaircall(config={'api_id': 'a', 'api_token': 'b', "
+        "'normalize_calls': True}, parse_env_config=False)"
+    ),
+}
+
+
+def run(code: str) -> float:
+    """Return the wall time of a fresh interpreter running `code`."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Print the median wall time of each case."""
+    for name, code in CASES.items():
+        seconds = statistics.median(run(code) for _ in range(RUNS))
+        print(f"{name:>28}: {seconds * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
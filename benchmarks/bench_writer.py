@@ -0,0 +1,60 @@
+"""RECORD messages per second of the SDK writer and of `RecordWriter`.
+
+Post-processed calls are written to a file on disk through each output
+backend, including the SDK's per-record conformance to the schema. Run with
+``poetry run python -m benchmarks.bench_writer``.
+"""
+
+import copy
+import os
+import sys
+import tempfile
+import time
+
+from tap_aircall.output import RecordWriter
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.fixtures import make_call
+
+CALLS = 5000
+
+
+def run(backend: str, records: list) -> float:
+    """Return the messages per second written with `backend`."""
+    tap = Tapaircall(
+        config={"api_id": "id", "api_token": "token", "output_backend": backend},
+        parse_env_config=False,
+    )
+    stream = tap.streams["calls"]
+    rows = [copy.deepcopy(record) for record in records]
+    saved = sys.stdout
+    with tempfile.TemporaryFile("w") as target:
+        sys.stdout = target
+        try:
+            if backend != "sdk":
+                # as set up by `Tapaircall.sync_all`
+                tap.record_writer = RecordWriter(backend)
+            start = time.perf_counter()
+            for row in rows:
+                stream._write_record_message(row)
+            if tap.record_writer is not None:
+                tap.record_writer.flush()
+            target.flush()
+            os.fsync(target.fileno())
+            seconds = time.perf_counter() - start
+        finally:
+            sys.stdout = saved
+    return len(rows) / seconds
+
+
+def main() -> None:
+    """Print the throughput of each backend."""
+    stream = Tapaircall(
+        config={"api_id": "id", "api_token": "token"}, parse_env_config=False
+    ).streams["calls"]
+    records = [stream.post_process(make_call(i), None) for i in range(1, CALLS + 1)]
+    for backend in ("sdk", "json", "orjson"):
+        print(f"{backend:>6}: {run(backend, records):,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from typing import List, Callable, Tuple
+import contextlib
+from typing import List, Callable, Optional, Tuple
 import click
 
 from pathlib import Path
@@ -8,6 +9,8 @@ from singer_sdk.helpers._classproperty import classproperty
 from singer_sdk.tap_base import CliTestOptionValue
 from singer_sdk.cli import common_options
 
+from tap_aircall.metrics import SamplingProfiler, SyncMetrics
+
 CONFIG_OPTION = click.option(
     "-c", "--config",
     multiple=True,
@@ -46,6 +49,22 @@ STATE_OPTION = click.option(
     help="Use a bookmarks file for incremental replication.",
     type=click.Path(),
 )
+WEBHOOKS_OPTION = click.option(
+    "--webhooks",
+    is_flag=True,
+    help="Receive webhook events and write their records, until interrupted.",
+)
+METRICS_FILE_OPTION = click.option(
+    "--metrics-file",
+    help="Write per-stream counters and latency histograms of the run, as JSON.",
+    type=click.Path(dir_okay=False),
+)
+PROFILE_OPTION = click.option(
+    "--profile",
+    help="Write a sampling profile of the run, as folded stacks.",
+    type=click.Path(dir_okay=False),
+)
+
 
 class _Tap(Tap):
     """
@@ -56,7 +75,13 @@ class _Tap(Tap):
         - If both are provided, --state arg is accepted first
     2. --properties arg as the same as --catalog, but deprecated
         - If both are provided, --catalog arg is accepted first
+    3. --webhooks to run `listen_webhooks` instead of `sync_all`, for taps
+       receiving webhook events
+    4. --metrics-file and --profile to measure the run
     """
+    # Collects the performance metrics of the run, with --metrics-file.
+    metrics: Optional[SyncMetrics] = None
+
     @classproperty
     def cli(cls) -> Callable:
         """Execute standard CLI handler for taps.
@@ -74,6 +99,9 @@ class _Tap(Tap):
         @CATALOG_OPTION
         @PROPERTIES_OPTION
         @STATE_OPTION
+        @WEBHOOKS_OPTION
+        @METRICS_FILE_OPTION
+        @PROFILE_OPTION
         @click.command(
             help="Execute the Singer tap.",
             context_settings={"help_option_names": ["--help"]},
@@ -88,6 +116,9 @@ class _Tap(Tap):
             catalog: str = None,
             properties: str = None,
             format: str = None,
+            webhooks: bool = False,
+            metrics_file: str = None,
+            profile: str = None,
         ) -> None:
             """Handle command line execution.
 
@@ -104,6 +135,9 @@ class _Tap(Tap):
                 --properties: Same as, but deprecated in favour of `catalog`.
                 --state: Use a bookmarks file for incremental replication.
                 -s: Same as `state`
+                --webhooks: Receive webhook events instead of syncing.
+                --metrics-file: Write per-stream performance metrics to a file.
+                --profile: Write a sampling profile of the run to a file.
 
             Raises:
                 FileNotFoundError: If the config file does not exist.
@@ -148,15 +182,32 @@ class _Tap(Tap):
                 validate_config=validate_config,
             )
 
-            if discover:
-                tap.run_discovery()
-                if test == CliTestOptionValue.All.value:
-                    tap.run_connection_test()
-            elif test == CliTestOptionValue.All.value:
-                tap.run_connection_test()
-            elif test == CliTestOptionValue.Schema.value:
-                tap.write_schemas()
-            else:
-                tap.sync_all()
+            if metrics_file:
+                tap.metrics = SyncMetrics()
+            profiler = SamplingProfiler() if profile else contextlib.nullcontext()
+            try:
+                with profiler:
+                    if discover:
+                        tap.run_discovery()
+                        if test == CliTestOptionValue.All.value:
+                            tap.run_connection_test()
+                    elif test == CliTestOptionValue.All.value:
+                        tap.run_connection_test()
+                    elif test == CliTestOptionValue.Schema.value:
+                        tap.write_schemas()
+                    elif webhooks:
+                        if not hasattr(tap, "listen_webhooks"):
+                            raise click.UsageError(
+                                f"{tap.name} does not receive webhook events."
+                            )
+                        tap.listen_webhooks()
+                    else:
+                        tap.sync_all()
+            finally:
+                # also written when the run fails, to see where it was slow
+                if metrics_file:
+                    tap.metrics.write(metrics_file)
+                if profile:
+                    profiler.write(profile)
 
         return cli
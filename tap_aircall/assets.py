@@ -0,0 +1,170 @@
+"""Download of the recordings and voicemails of calls."""
+
+import abc
+import contextlib
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+
+class AssetStorage(abc.ABC):
+    """Where assets are stored, by key such as `123/recording.mp3`."""
+
+    @abc.abstractmethod
+    def stat(self, key: str) -> Optional[Tuple[int, str]]:
+        """Return the size and sha256 of a stored asset, None if not stored."""
+
+    @abc.abstractmethod
+    def save(self, key: str, chunks: Iterable[bytes]) -> Tuple[int, str]:
+        """Store an asset from a stream of chunks, returning its size and sha256."""
+
+    @abc.abstractmethod
+    def locate(self, key: str) -> str:
+        """Return the path or URL a stored asset can be read from."""
+
+
+class LocalStorage(AssetStorage):
+    """Store assets as files under a local directory."""
+
+    def __init__(self, root: str) -> None:
+        """Create a storage writing its files under `root`."""
+        self.root = Path(root).absolute()
+
+    def stat(self, key: str) -> Optional[Tuple[int, str]]:
+        """Return the size and sha256 of a stored file, None if not stored.
+
+        They are read from the `.sha256` file written next to it, the file is
+        only hashed again when that one is missing or stale.
+        """
+        path = self.root / key
+        if not path.is_file():
+            return None
+        size = path.stat().st_size
+        checksum = path.with_name(path.name + ".sha256")
+        with contextlib.suppress(OSError, ValueError):
+            stored_size, sha256 = checksum.read_text().split()
+            if int(stored_size) == size:
+                return size, sha256
+        digest = hashlib.sha256()
+        with path.open("rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        checksum.write_text(f"{size} {digest.hexdigest()}\n")
+        return size, digest.hexdigest()
+
+    def save(self, key: str, chunks: Iterable[bytes]) -> Tuple[int, str]:
+        """Write a file chunk by chunk, only showing it once complete."""
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + ".part")
+        digest = hashlib.sha256()
+        size = 0
+        with partial.open("wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        path.with_name(path.name + ".sha256").write_text(
+            f"{size} {digest.hexdigest()}\n"
+        )
+        os.replace(partial, path)
+        return size, digest.hexdigest()
+
+    def locate(self, key: str) -> str:
+        """Return the absolute path of a stored file."""
+        return str(self.root / key)
+
+
+# Storages selectable with the `asset_storage` setting, built from `asset_dir`.
+STORAGES: Dict[str, Callable[[str], AssetStorage]] = {
+    "local": LocalStorage,
+}
+
+
+class AssetDownloader:
+    """Download assets in a bounded thread pool, handing results back in order.
+
+    Files are streamed to the storage without being held in memory. An asset
+    already stored is not requested again: storages only show complete files,
+    and the assets of a call do not change.
+
+    Results come out of `results()` in the order the downloads were submitted;
+    a failed download gives a result with an `error` instead of a `path`.
+    """
+
+    def __init__(
+        self,
+        storage: AssetStorage,
+        session: requests.Session,
+        max_workers: int = 4,
+        timeout: Tuple[float, float] = (10, 300),
+    ) -> None:
+        """Create a downloader running `max_workers` downloads at a time."""
+        self.storage = storage
+        self._session = session
+        self._timeout = timeout
+        self._max_workers = max(max_workers, 1)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="aircall-asset"
+        )
+        self._pending: Deque[Future] = deque()
+
+    def submit(self, call_id: int, kind: str, url: str) -> None:
+        """Start downloading the asset of a call, e.g. its "recording"."""
+        self._pending.append(self._executor.submit(self._download, call_id, kind, url))
+
+    def results(self, wait: bool = False) -> Iterator[dict]:
+        """Yield the results of the downloads done, in submission order.
+
+        With `wait`, every download is waited for. Otherwise only the oldest
+        ones are, while more than two per worker are pending.
+        """
+        while self._pending and (
+            wait
+            or self._pending[0].done()
+            or len(self._pending) > 2 * self._max_workers
+        ):
+            yield self._pending.popleft().result()
+
+    def close(self) -> None:
+        """Cancel the pending downloads and stop the workers."""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=True)
+
+    def _download(self, call_id: int, kind: str, url: str) -> dict:
+        suffix = Path(urlparse(url).path).suffix or ".mp3"
+        key = f"{call_id}/{kind}{suffix}"
+        result = {"call_id": call_id, "kind": kind}
+        try:
+            stored = self.storage.stat(key)
+            downloaded = stored is None
+            if stored is None:
+                # the announced size must be the size of the file
+                with self._session.get(
+                    url,
+                    stream=True,
+                    timeout=self._timeout,
+                    headers={"Accept-Encoding": "identity"},
+                ) as response:
+                    response.raise_for_status()
+                    stored = self.storage.save(
+                        key, response.iter_content(chunk_size=1024 * 1024)
+                    )
+        except (requests.RequestException, OSError) as ex:
+            result["error"] = str(ex)
+            return result
+        result.update(
+            path=self.storage.locate(key),
+            size=stored[0],
+            sha256=stored[1],
+            downloaded=downloaded,
+        )
+        return result
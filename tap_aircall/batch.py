@@ -0,0 +1,69 @@
+"""Batch files of records, announced by the BATCH messages of the SDK.
+
+Streams write them from `get_batches`, through the storage target of the
+SDK `batch_config` (see `aircallStream.get_batch_config`); the SDK announces
+each file with a BATCH message in its format::
+
+    {"type": "BATCH", "stream": "calls",
+     "encoding": {"format": "jsonl", "compression": "gzip"},
+     "manifest": ["file:///.../tap-aircall--calls-<uuid>-1.json.gz"]}
+"""
+
+import gzip
+import json
+import threading
+from typing import IO, Callable, Iterable, Optional
+
+from fs.base import FS
+
+
+class BatchFiles:
+    """Count the batch files of a run written but not announced yet.
+
+    A STATE message must only be written while none is `pending`, so that it
+    never covers records of a file the target has not been told about.
+    """
+
+    def __init__(self) -> None:
+        """Create a counter with no pending file."""
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Return the number of files opened and not announced yet."""
+        with self._lock:
+            return self._pending
+
+    def opened(self) -> None:
+        """Count a file being written."""
+        with self._lock:
+            self._pending += 1
+
+    def announced(self) -> None:
+        """Count a file announced, or given up."""
+        with self._lock:
+            self._pending -= 1
+
+
+def write_batch_file(
+    filesystem: FS,
+    filename: str,
+    records: Iterable[dict],
+    compression: Optional[str] = "gzip",
+    dumps: Callable[[dict], str] = json.dumps,
+) -> int:
+    """Write records to a JSONL file, one per line, returning how many."""
+    count = 0
+    with filesystem.open(filename, "wb") as raw:
+        file: IO[bytes] = raw
+        if compression == "gzip":
+            file = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=1)
+        try:
+            for record in records:
+                file.write((dumps(record) + "\n").encode("utf-8"))
+                count += 1
+        finally:
+            if file is not raw:
+                file.close()
+    return count
@@ -0,0 +1,101 @@
+"""On-disk cache of API responses, to re-run known queries without the API."""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import requests
+
+
+class ResponseCache:
+    """Gzip-compressed response bodies, keyed by request path and query.
+
+    Entries older than the `max_age` given to `get()` are misses. Once the
+    files take more than `max_bytes`, the least recently written ones are
+    deleted. Entries are written to a temporary file first, so concurrent
+    readers never see a partial one; the temporary files left by an
+    interrupted run are deleted when the cache is opened.
+    """
+
+    def __init__(self, root: Path, max_bytes: int = 1024 * 1024 * 1024) -> None:
+        """Create a cache storing its files in the `root` directory."""
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        for partial in self.root.glob("*.part"):
+            partial.unlink(missing_ok=True)
+        # Size of each entry, from the least to the most recently written.
+        self._sizes: "OrderedDict[Path, int]" = OrderedDict()
+        stats = [(path, path.stat()) for path in self.root.glob("*.json.gz")]
+        for path, stat in sorted(stats, key=lambda item: item[1].st_mtime):
+            self._sizes[path] = stat.st_size
+        # Total of `_sizes`, kept up to date by `put` and `_evict`.
+        self._size = sum(self._sizes.values())
+
+    @staticmethod
+    def key(namespace: str, url: str) -> str:
+        """Return the key of a request, whatever the order of its parameters."""
+        parts = urlparse(url)
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        request = f"{namespace} {parts.netloc}{parts.path}?{query}"
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json.gz"
+
+    def get(self, key: str, max_age: Optional[float]) -> Optional[Tuple[dict, bytes]]:
+        """Return the metadata and body of an entry, None if missing or too old."""
+        path = self._path(key)
+        try:
+            if max_age is not None and time.time() - path.stat().st_mtime > max_age:
+                return None
+            with gzip.open(path, "rb") as file:
+                meta = json.loads(file.readline())
+                return meta, file.read()
+        except (OSError, ValueError, EOFError):  # missing, evicted or corrupt
+            return None
+
+    def put(self, key: str, meta: dict, body: bytes) -> None:
+        """Store an entry, then evict the oldest ones if over `max_bytes`."""
+        path = self._path(key)
+        partial = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+        with gzip.open(partial, "wb", compresslevel=1) as file:
+            file.write(json.dumps(meta).encode("utf-8") + b"\n")
+            file.write(body)
+        os.replace(partial, path)
+        with self._lock:
+            size = path.stat().st_size
+            self._size += size - self._sizes.pop(path, 0)
+            self._sizes[path] = size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._sizes:
+            path, size = self._sizes.popitem(last=False)
+            self._size -= size
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def cached_response(
+    request: requests.PreparedRequest, meta: dict, body: bytes
+) -> requests.Response:
+    """Return a response to `request` made of a cache entry."""
+    response = requests.Response()
+    response.status_code = meta.get("status", 200)
+    response.headers.update(meta.get("headers") or {})
+    response._content = body  # type: ignore[attr-defined]
+    response.url = request.url or ""
+    response.request = request
+    response.encoding = "utf-8"
+    return response
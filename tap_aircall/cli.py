@@ -0,0 +1,40 @@
+"""Command line entry point of the tap.
+
+`--version` is answered from the package metadata, without importing the
+Singer SDK; every other invocation is handed to `Tapaircall.cli`.
+"""
+
+import sys
+from typing import Optional, Sequence
+
+# `Tapaircall.name`
+NAME = "tap-aircall"
+
+
+def package_version(package: str) -> str:
+    """Return the installed version of a package, as the SDK reports it."""
+    try:
+        from importlib import metadata
+    except ImportError:  # Python 3.7
+        import importlib_metadata as metadata  # type: ignore[no-redef]
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "[could not be detected]"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the tap CLI, importing the tap only when it is needed."""
+    args = list(sys.argv[1:] if argv is None else argv)
+    if "--version" in args and "--help" not in args:
+        print(f"{NAME} v{package_version(NAME)}, "
+              f"Meltano SDK v{package_version('singer-sdk')}")
+        return
+
+    from tap_aircall.tap import Tapaircall
+
+    Tapaircall.cli(args=args, prog_name=NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,79 +1,774 @@
 """REST client handling, including aircallStream base class."""
 
 from pathlib import Path
-from typing import Any, Dict, Optional, Iterable, Callable, Generator
+from typing import (
+    Any, Dict, Optional, Iterable, Generator, List, Mapping, Tuple
+)
 from urllib.parse import urlparse, parse_qs
 
+import itertools
+import json
+import re
 import requests
+import threading
 import time
+import uuid
 import backoff
 
-from datetime import datetime
+from datetime import datetime, timezone
+import singer_sdk._singerlib as singer
+from singer_sdk import metrics as sdk_metrics
 from singer_sdk.authenticators import BasicAuthenticator
+from singer_sdk.helpers._batch import (
+    BaseBatchFileEncoding, BatchConfig, JSONLinesEncoding, StorageTarget
+)
+from singer_sdk.helpers._util import utc_now
 from singer_sdk.helpers.jsonpath import extract_jsonpath
 from singer_sdk.streams import RESTStream
-from singer_sdk.exceptions import RetriableAPIError
+from singer_sdk.exceptions import ConfigValidationError, FatalAPIError
+
+from tap_aircall.batch import write_batch_file
+from tap_aircall.cache import cached_response
+from tap_aircall.conform import (
+    Conformer, Validator, compile_conformer, compile_validator
+)
+from tap_aircall.jsonstream import iter_json_records
+from tap_aircall.metrics import StreamMetrics
+from tap_aircall.output import ENCODERS
+from tap_aircall.pager import PagePipeline
+from tap_aircall.ratelimit import RateLimiter
 
 SCHEMAS_DIR = Path(__file__).parent / Path("./schemas")
 
+_UNCOMPILED = object()
+
+# JSONPath of records held in a top-level array of the page, e.g. `$.calls[*]`.
+_TOP_LEVEL_RECORDS = re.compile(r"\$\.(\w+)\[\*\]")
+
+# A datetime plan lists, for one level of a JSON schema, the `date-time` keys,
+# the keys of `date-time` arrays, and the (key, plan) pairs of the nested
+# objects and arrays of objects holding more of them.
+DatetimePlan = Tuple[
+    Tuple[str, ...],
+    Tuple[str, ...],
+    Tuple[Tuple[str, "DatetimePlan"], ...],
+    Tuple[Tuple[str, "DatetimePlan"], ...],
+]
+
+
+def compile_datetime_plan(schema: dict) -> Optional[DatetimePlan]:
+    """Return the plan reaching every `date-time` property of a JSON schema."""
+    leaves, leaf_arrays, objects, arrays = [], [], [], []
+    for key, prop in schema.get("properties", {}).items():
+        types = prop.get("type", ())
+        is_array = "array" in ((types,) if isinstance(types, str) else types)
+        if is_array:
+            prop = prop.get("items", {})
+        if prop.get("format") == "date-time":
+            (leaf_arrays if is_array else leaves).append(key)
+        elif "properties" in prop:
+            sub_plan = compile_datetime_plan(prop)
+            if sub_plan:
+                (arrays if is_array else objects).append((key, sub_plan))
+    if not (leaves or leaf_arrays or objects or arrays):
+        return None
+    return tuple(leaves), tuple(leaf_arrays), tuple(objects), tuple(arrays)
+
+
+# Conversion tables: the date part is cached per day, the time of day is
+# assembled from precomputed "THH:MM:" and "SS+00:00" fragments.
+_ISO_DAYS: Dict[int, str] = {}
+_ISO_MINUTES = tuple(f"T{h:02d}:{m:02d}:" for h in range(24) for m in range(60))
+_ISO_SECONDS = tuple(f"{s:02d}+00:00" for s in range(60))
+
+
+def unix_to_iso(value: float) -> str:
+    """Return the ISO-8601 UTC representation of a unix timestamp."""
+    if type(value) is not int:
+        return datetime.fromtimestamp(value, timezone.utc).isoformat()
+    day, second = divmod(value, 86400)
+    date = _ISO_DAYS.get(day)
+    if date is None:
+        if len(_ISO_DAYS) > 100000:
+            _ISO_DAYS.clear()
+        date = _ISO_DAYS[day] = time.strftime("%Y-%m-%d", time.gmtime(value))
+    minute, second = divmod(second, 60)
+    return date + _ISO_MINUTES[minute] + _ISO_SECONDS[second]
+
+
+def apply_datetime_plan(row: dict, plan: DatetimePlan) -> None:
+    """Convert in place the unix timestamps reached by `plan` to ISO strings."""
+    leaves, leaf_arrays, objects, arrays = plan
+    for key in leaves:
+        value = row.get(key)
+        if type(value) is int or type(value) is float:
+            row[key] = unix_to_iso(value)
+    for key in leaf_arrays:
+        values = row.get(key)
+        if values:
+            row[key] = [
+                unix_to_iso(v) if type(v) is int or type(v) is float else v
+                for v in values
+            ]
+    for key, sub_plan in objects:
+        value = row.get(key)
+        if value:
+            apply_datetime_plan(value, sub_plan)
+    for key, sub_plan in arrays:
+        for item in row.get(key) or ():
+            if item:
+                apply_datetime_plan(item, sub_plan)
+
+
+# A projection maps each selected property of a schema level to the projection
+# of its sub-properties, or to None when the whole value is selected.
+Projection = Dict[str, Optional["Projection"]]
+
+
+def compile_projection(
+    schema: dict, mask: Mapping[tuple, bool], breadcrumb: tuple = ()
+) -> Optional[Projection]:
+    """Return the properties of a schema selected by a catalog, None if all are.
+
+    The sub-properties of arrays of objects are selected like those of objects,
+    with no "items" in their breadcrumb.
+    """
+    projection: Projection = {}
+    complete = True
+    for key, prop in schema.get("properties", {}).items():
+        property_breadcrumb = breadcrumb + ("properties", key)
+        if not mask[property_breadcrumb]:
+            complete = False
+            continue
+        types = prop.get("type", ())
+        if "array" in ((types,) if isinstance(types, str) else types):
+            prop = prop.get("items", {})
+        sub_projection = None
+        if "properties" in prop:
+            sub_projection = compile_projection(prop, mask, property_breadcrumb)
+            complete = complete and sub_projection is None
+        projection[key] = sub_projection
+    return None if complete else projection
+
+
+def apply_projection(row: dict, projection: Projection) -> dict:
+    """Return a copy of a record restricted to the properties of `projection`."""
+    projected = {}
+    for key, sub_projection in projection.items():
+        if key not in row:
+            continue
+        value = row[key]
+        if sub_projection is not None and value:
+            if type(value) is dict:
+                value = apply_projection(value, sub_projection)
+            elif type(value) is list:
+                value = [
+                    apply_projection(item, sub_projection)
+                    if type(item) is dict else item
+                    for item in value
+                ]
+        projected[key] = value
+    return projected
+
 
 class aircallStream(RESTStream):
     """aircall stream class."""
 
-    url_base = "https://api.aircall.io/"
+    @property
+    def url_base(self) -> str:
+        """Return the API base URL, overridable for local mocks."""
+        return self.config.get("api_url") or "https://api.aircall.io/"
 
     records_jsonpath = "$[*]"  # Or override `parse_response`.
     next_page_token_jsonpath = "$.meta.next_page_link"  # Or override `get_next_page_token`.
 
+    # Page-based pagination stops being served once page * per_page goes past
+    # this depth; queries are restarted at page 1 before reaching it.
+    max_pagination_depth = 10000
+
+    # Keys of the partition contexts, which the SDK copies to every record.
+    context_keys: Tuple[str, ...] = ()
+
+    # Largest `per_page` accepted by the API.
+    max_page_size = 50
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the stream and its pagination restart bookkeeping."""
+        super().__init__(*args, **kwargs)
+        if self._tap.account is not None or self.config.get("accounts"):
+            self._schema = self.with_account_property(self._schema)
+            self.primary_keys = ["account", *(self.primary_keys or [])]
+        # ids already emitted at the `from` of each restarted query
+        self._boundary_ids: Dict[float, set] = {}
+        self._boundary_lock = threading.Lock()
+        self._authenticator: Optional[BasicAuthenticator] = None
+        self._http_headers: Optional[dict] = None
+        self._datetime_plan = compile_datetime_plan(self.schema)
+        self._conform: Optional[Conformer] = None
+        self._validate: Optional[Validator] = None
+        self._records_generated = 0
+        self._projection: Any = _UNCOMPILED
+        self._output_projection: Any = _UNCOMPILED
+        self._checkpoint_context: Optional[dict] = None
+        self._checkpoint_value: Any = None
+        self._checkpoint_ids: list = []
+        self._checkpoint_records = 0
+        self._records_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+        self._batching = False
+
+    def with_account_property(self, schema: dict) -> dict:
+        """Return the schema with the "account" of multi-account runs, if any."""
+        if self._tap.account is None and not self.config.get("accounts"):
+            return schema
+        # the records of every account go to the same stream
+        properties = {**schema["properties"], "account": {"type": ["string"]}}
+        return {**schema, "properties": properties}
+
+    # The tap state is shared by every stream; these are the SDK methods that
+    # read or grow it while a stream syncs, possibly next to other streams.
+
+    def get_context_state(self, context: Optional[dict]) -> dict:
+        """Return the writable state of a context, holding the tap state lock."""
+        with self._tap.state_lock:
+            return super().get_context_state(context)
+
+    def _increment_stream_state(
+            self, latest_record: Dict[str, Any], *, context: Optional[dict] = None
+    ) -> None:
+        with self._tap.state_lock:
+            super()._increment_stream_state(latest_record, context=context)
+        if self.replication_key:
+            self._track_checkpoint(latest_record, context)
+
+    # Mid-stream checkpoints: the SDK only commits the bookmark of an unsorted
+    # stream once the whole stream is synced. While a long sync runs, the
+    # context state also gets a "checkpoint" with the highest replication key
+    # value written so far and the ids written at that value. It is written
+    # every `checkpoint_records` records or `checkpoint_seconds` seconds (after
+    # each file in batch mode), and removed once the context is fully synced.
+
+    def _track_checkpoint(self, record: dict, context: Optional[dict]) -> None:
+        """Follow the written records and emit a checkpoint STATE when due."""
+        value = record.get(self.replication_key)
+        if context != self._checkpoint_context:
+            self._checkpoint_context = context
+            self._checkpoint_value = None
+            self._checkpoint_records = 0
+        if value is not None and value == self._checkpoint_value:
+            self._checkpoint_ids.append(record.get("id"))
+        elif value is not None:
+            self._checkpoint_value = value
+            self._checkpoint_ids = [record.get("id")]
+        self._checkpoint_records += 1
+        self._records_since_checkpoint += 1
+
+        if self._batching:
+            # saved by `get_batches` as each file is closed
+            return
+        every_records = self.config.get("checkpoint_records", 5000)
+        every_seconds = self.config.get("checkpoint_seconds", 60)
+        due = bool(
+            (every_records and self._records_since_checkpoint >= every_records)
+            or (
+                every_seconds
+                and time.monotonic() - self._last_checkpoint >= every_seconds
+            )
+        )
+        if not due:
+            return
+        if self._save_checkpoint():
+            self._write_state_message()
+        self._records_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+
+    def _save_checkpoint(self) -> bool:
+        """Put the checkpoint of the last record written in its context state."""
+        if self._checkpoint_value is None:
+            return False
+        with self._tap.state_lock:
+            self.get_context_state(self._checkpoint_context)["checkpoint"] = {
+                "replication_key_value": self._checkpoint_value,
+                "ids": list(self._checkpoint_ids),
+                "records": self._checkpoint_records,
+            }
+        return True
+
+    def _resume_from_checkpoint(self, context: Optional[dict]) -> Optional[float]:
+        """Return the `from` to resume an interrupted sync of the context at.
+
+        The ids written at the checkpoint value are dropped from the resumed
+        query by `parse_response`, so no record is emitted twice.
+        """
+        checkpoint = self.get_context_state(context).get("checkpoint")
+        if not checkpoint:
+            return None
+        resume_from = self._record_unix_time(
+            {self.replication_key: checkpoint["replication_key_value"]}
+        )
+        with self._boundary_lock:
+            self._boundary_ids[float(resume_from)] = set(checkpoint["ids"])
+        self.logger.info(
+            f"Resuming {self.name} {context or ''} from checkpoint at "
+            f"{checkpoint['replication_key_value']}."
+        )
+        return resume_from
+
+    def _clear_checkpoint(self, context: Optional[dict]) -> None:
+        """Drop the checkpoint of a context whose records were all written."""
+        with self._tap.state_lock:
+            self.get_context_state(context).pop("checkpoint", None)
+
+    def _write_state_message(self) -> None:
+        with self._tap.state_lock:
+            if self._tap.batch_files.pending:
+                # deferred until the records it covers are in announced files
+                return
+            self._tap.write_state_message()
+
+    # Batch mode: with the SDK `batch_config`, or `batch_dir`, the records of
+    # the streams setting `batched` go to JSONL files announced by BATCH
+    # messages. Child streams are synced once per parent record, they keep
+    # writing RECORD messages rather than a file each time.
+    batched = False
+
+    def get_batch_config(self, config: Mapping) -> Optional[BatchConfig]:
+        """Return the batch config of the run, gzip files in `batch_dir` if set."""
+        if not self.batched:
+            return None
+        batch_config = super().get_batch_config(config)
+        if batch_config is None and config.get("batch_dir"):
+            batch_config = BatchConfig(
+                encoding=JSONLinesEncoding(compression="gzip"),
+                storage=StorageTarget(
+                    root=Path(config["batch_dir"]).absolute().as_uri()
+                ),
+            )
+        return batch_config
+
+    def get_batches(
+            self, batch_config: BatchConfig, context: Optional[dict] = None
+    ) -> Iterable[Tuple[BaseBatchFileEncoding, List[str]]]:
+        """Write the records to files of `batch_records` records.
+
+        Records are conformed as for RECORD messages. The STATE messages of the
+        run are deferred from the opening of a file to its BATCH message, and
+        the checkpoint of each full file is its last record.
+        """
+        compression = batch_config.encoding.compression
+        if compression not in (None, "none", "gzip"):
+            raise ConfigValidationError(
+                f"Unsupported batch file compression: {compression}"
+            )
+        suffix = ".json.gz" if compression == "gzip" else ".json"
+        batch_records = max(self.config.get("batch_records", 100000), 1)
+        backend = self.config.get("output_backend", "sdk")
+        dumps = ENCODERS["json" if backend == "sdk" else backend]
+        prefix = (
+            f"{batch_config.storage.prefix or ''}"
+            f"{self.tap_name}--{self.name}-{uuid.uuid4()}"
+        )
+        records = (
+            message.record
+            for record in self._sync_records(context, write_messages=False)
+            for message in self._generate_record_messages(record)
+        )
+        self._batching = True
+        try:
+            with batch_config.storage.fs(writeable=True, create=True) as filesystem:
+                for sequence in itertools.count(1):
+                    filename = f"{prefix}-{sequence}{suffix}"
+                    self._tap.batch_files.opened()
+                    try:
+                        count = write_batch_file(
+                            filesystem,
+                            filename,
+                            itertools.islice(records, batch_records),
+                            compression,
+                            dumps,
+                        )
+                    except BaseException:
+                        self._tap.batch_files.announced()
+                        raise
+                    if not count:
+                        self._tap.batch_files.announced()
+                        filesystem.remove(filename)
+                        return
+                    if count == batch_records:
+                        # the stream may go on, resume after this file
+                        self._save_checkpoint()
+                    yield batch_config.encoding, [filesystem.geturl(filename)]
+                    if count < batch_records:
+                        return
+        finally:
+            self._batching = False
+
+    def _write_batch_message(
+            self, encoding: BaseBatchFileEncoding, manifest: List[str]
+    ) -> None:
+        with self._tap.state_lock:
+            if self._tap.record_writer is not None:
+                self._tap.record_writer.flush()
+            super()._write_batch_message(encoding, manifest)
+            # the STATE messages can cover the file's records from now on
+            self._tap.batch_files.announced()
+
+    def _write_schema_message(self) -> None:
+        if self._tap.record_writer is not None:
+            # e.g. a child stream's schema, after the parent record it follows
+            self._tap.record_writer.flush()
+        super()._write_schema_message()
+
+    def _write_record_message(self, record: dict) -> None:
+        """Write the record through the tap's record writer, if any."""
+        metrics = self.metrics
+        if metrics is None:
+            self._emit_record(record)
+            return
+        started = time.perf_counter()
+        self._emit_record(record)
+        metrics.add("records")
+        metrics.add("emit_seconds", time.perf_counter() - started)
+
+    def _emit_record(self, record: dict) -> None:
+        writer = self._tap.record_writer
+        if writer is None:
+            super()._write_record_message(record)
+            return
+        for message in self._generate_record_messages(record):
+            writer.write(message.stream, message.record, message.time_extracted)
+
+    def _generate_record_messages(
+            self, record: dict
+    ) -> Generator[singer.RecordMessage, None, None]:
+        """Generate the RECORD messages of a record, as the SDK does.
+
+        The catalog selection and the schema are applied by functions compiled
+        for the stream, instead of being looked up property by property. One in
+        `validate_every` records is also validated against the schema. Records
+        of a multi-account run are tagged with their account here, for both the
+        RECORD messages and the batch files.
+        """
+        if self._tap.account is not None:
+            record["account"] = self._tap.account
+        projection = self.output_projection
+        if projection is not None:
+            record = apply_projection(record, projection)
+        if self._conform is None:
+            self._conform = compile_conformer(
+                self.name, self.schema, self.logger, self.context_keys
+            )
+        record = self._conform(record)
+        validate_every = self.config.get("validate_every")
+        if validate_every:
+            if self._records_generated % validate_every == 0:
+                self._validate_record(record)
+            self._records_generated += 1
+        for stream_map in self.stream_maps:
+            mapped_record = stream_map.transform(record)
+            if mapped_record is not None:
+                yield singer.RecordMessage(
+                    stream=stream_map.stream_alias,
+                    record=mapped_record,
+                    version=None,
+                    time_extracted=utc_now(),
+                )
+
+    def _validate_record(self, record: dict) -> None:
+        """Log how a record breaks the stream schema, if it does."""
+        if self._validate is None:
+            self._validate = compile_validator(self.schema)
+        errors = self._validate(record)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.add("validated_records")
+        if not errors:
+            return
+        if metrics is not None:
+            metrics.add("invalid_records")
+        self.logger.warning(
+            f"Record {record.get('id')} of {self.name} does not match its schema: "
+            + "; ".join(errors[:5])
+        )
+
+    def finalize_state_progress_markers(self, state: Optional[dict] = None) -> None:
+        """Finalize the progress markers, holding the tap state lock."""
+        with self._tap.state_lock:
+            super().finalize_state_progress_markers(state)
+
     @property
     def authenticator(self) -> BasicAuthenticator:
-        """Return a new authenticator object."""
-        return BasicAuthenticator.create_for_stream(
-            self,
-            username=self.config.get("api_id"),
-            password=self.config.get("api_token"),
-        )
+        """Return the authenticator object, built once per stream."""
+        if self._authenticator is None:
+            self._authenticator = BasicAuthenticator.create_for_stream(
+                self,
+                username=self.config.get("api_id"),
+                password=self.config.get("api_token"),
+            )
+        return self._authenticator
 
     @property
     def http_headers(self) -> dict:
         """Return the http headers needed."""
-        headers = {}
-        if "user_agent" in self.config:
-            headers["User-Agent"] = self.config.get("user_agent")
-        # If not using an authenticator, you may also provide inline auth headers:
-        # headers["Private-Token"] = self.config.get("auth_token")
-        return headers
+        if self._http_headers is None:
+            headers = {}
+            if "user_agent" in self.config:
+                headers["User-Agent"] = self.config.get("user_agent")
+            # If not using an authenticator, you may also provide inline auth headers:
+            # headers["Private-Token"] = self.config.get("auth_token")
+            self._http_headers = headers
+        # the SDK adds the auth headers to the returned dict
+        return dict(self._http_headers)
+
+    @property
+    def requests_session(self) -> requests.Session:
+        """Return the pooled, keep-alive session shared by the whole tap."""
+        return self._tap.requests_session
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Return the (connect, read) timeouts of a request, in seconds."""
+        return (
+            self.config.get("connect_timeout", 10),
+            self.config.get("read_timeout", 300),
+        )
+
+    @property
+    def page_size(self) -> int:
+        """Return the configured `per_page`, the API maximum by default."""
+        page_size = self.config.get("page_size") or self.max_page_size
+        return min(page_size, self.max_page_size)
+
+    @property
+    def start_date(self) -> Optional[datetime]:
+        """Return the configured `start_date`, if any."""
+        start_date = self.config.get("start_date")
+        if not start_date:
+            return None
+        return datetime.fromisoformat(start_date.replace("Z", "+00:00"))
+
+    @property
+    def records_key(self) -> Optional[str]:
+        """Return the top-level key of the records, e.g. "calls" for `$.calls[*]`.
+
+        When set, records are read with a plain dict lookup instead of JSONPath.
+        """
+        match = _TOP_LEVEL_RECORDS.fullmatch(self.records_jsonpath)
+        return match.group(1) if match else None
+
+    @property
+    def stream_json(self) -> bool:
+        """Return True to decode the pages record by record, as they arrive.
+
+        The response cache stores whole bodies, so with `cache_dir` pages are
+        always read at once.
+        """
+        return bool(
+            self.records_key
+            and self.config.get("stream_json")
+            and not self.config.get("cache_dir")
+        )
+
+    @property
+    def metrics(self) -> Optional[StreamMetrics]:
+        """Return the metrics of the stream, when collected (`--metrics-file`)."""
+        metrics = self._tap.metrics
+        if metrics is None:
+            return None
+        if self._tap.account is not None:
+            return metrics.stream(f"{self._tap.account}/{self.name}")
+        return metrics.stream(self.name)
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Return the rate limiter shared by every stream of the tap."""
+        return self._tap.rate_limiter
+
+    def _request(
+            self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        """Serve the request from the response cache, or send it and cache it.
+
+        With `cache_dir`, successful responses are stored by URL. In the
+        default `cache_mode`, "readwrite", those younger than
+        `cache_ttl_seconds` are served without using the rate budget;
+        "record" always requests and stores, "replay" never requests and
+        fails on a cache miss.
+        """
+        cache = self._tap.response_cache
+        if cache is None:
+            return self._send(prepared_request, context)
+        mode = self.config.get("cache_mode", "readwrite")
+        key = cache.key(self.config.get("api_id", ""), prepared_request.url)
+        if mode != "record":
+            max_age = None if mode == "replay" else self.config.get(
+                "cache_ttl_seconds", 86400
+            )
+            entry = cache.get(key, max_age)
+            metrics = self.metrics
+            if entry is not None:
+                if metrics is not None:
+                    metrics.add("cache_hits")
+                return cached_response(prepared_request, *entry)
+            if mode == "replay":
+                raise FatalAPIError(
+                    f"No cached response for {prepared_request.url} in replay mode."
+                )
+        response = self._send(prepared_request, context)
+        meta = {
+            "url": prepared_request.url,
+            "status": response.status_code,
+            "headers": {"Content-Type": response.headers.get("Content-Type", "")},
+        }
+        cache.put(key, meta, response.content)
+        return response
+
+    def _send(
+            self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        """Wait for the shared rate limiter before sending the request."""
+        metrics = self.metrics
+        waited = self.rate_limiter.acquire()
+        if waited:
+            self.logger.info("METRIC: %s", json.dumps({
+                "type": "timer",
+                "metric": "rate_limit_wait",
+                "value": round(waited, 3),
+                "tags": {"stream": self.name},
+            }))
+            if metrics is not None:
+                metrics.add("rate_limit_wait_seconds", waited)
+        started = time.perf_counter()
+        try:
+            if not self.stream_json:
+                response = super()._request(prepared_request, context)
+                if metrics is not None:
+                    metrics.add("bytes", len(response.content))
+                return response
+            # the body is left on the wire, `parse_response` reads it record by
+            # record
+            response = self.requests_session.send(
+                prepared_request, timeout=self.timeout, stream=True
+            )
+            self._write_request_duration_log(
+                endpoint=self.path, response=response, context=context, extra_tags=None
+            )
+            self.validate_response(response)
+            return response
+        finally:
+            if metrics is not None:
+                metrics.add("requests")
+                metrics.observe("request_seconds", time.perf_counter() - started)
+
+    def backoff_handler(self, details: dict) -> None:
+        """Log the retry, and count it with its wait in the stream metrics."""
+        super().backoff_handler(details)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.add("retries")
+            metrics.add("backoff_seconds", details.get("wait") or 0)
+
+    def validate_response(self, response: requests.Response) -> None:
+        """Feed the rate-limit headers to the limiter, then validate."""
+        self.rate_limiter.update(response.headers, response.status_code)
+        super().validate_response(response)
 
     def get_next_page_token(
             self, response: requests.Response, previous_token: Optional[Any]
     ) -> Optional[Any]:
         """Return a token for identifying next page or None if no more pages."""
-        # TODO: If pagination is required, return a token which can be used to get the
-        #       next page. If this is the final page, return "None" to end the
-        #       pagination loop.
-        if self.next_page_token_jsonpath:
+        if self.next_page_token_jsonpath == "$.meta.next_page_link":
+            meta = self.response_payload(response).get("meta") or {}
+            next_page_token = meta.get("next_page_link")
+        elif self.next_page_token_jsonpath:
             all_matches = extract_jsonpath(
-                self.next_page_token_jsonpath, response.json()
+                self.next_page_token_jsonpath, self.response_payload(response)
             )
             first_match = next(iter(all_matches), None)
             next_page_token = first_match
         else:
             next_page_token = response.headers.get("X-Next-Page", None)
 
+        if next_page_token and self.replication_key:
+            # Every page of a query must use the `from` of its first page, which
+            # may come from a checkpoint or a restart rather than the bookmark.
+            query_from = self._query_value(response.request.url, "from")
+            if query_from and "query_from=" not in next_page_token:
+                next_page_token += f"&query_from={query_from}"
+            next_page_token = self._split_deep_pagination(response, next_page_token)
         return next_page_token
 
+    @staticmethod
+    def _query_value(url: str, key: str) -> Optional[str]:
+        """Return the first value of a query string parameter of `url`."""
+        values = parse_qs(urlparse(url).query).get(key)
+        return values[0] if values else None
+
+    def _record_unix_time(self, record: dict) -> Optional[float]:
+        """Return the replication key value of a record as a unix time."""
+        value = record.get(self.replication_key)
+        if value is None or isinstance(value, (int, float)):
+            return value
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+    def _split_deep_pagination(
+            self, response: requests.Response, next_page_link: str
+    ) -> str:
+        """Restart the query at page 1 before it hits the pagination depth cap.
+
+        The new query starts `from` the last replication key value seen, which
+        is the highest one since pages are requested in ascending order. Ids
+        already emitted at that exact timestamp are remembered so that
+        `parse_response` drops them from the restarted query.
+        """
+        page = int(self._query_value(next_page_link, "page") or 1)
+        per_page = int(self._query_value(next_page_link, "per_page") or self.page_size)
+        if page * per_page <= self.max_pagination_depth:
+            return next_page_link
+
+        records = self._page_records(response)
+        if not records:
+            return next_page_link
+        current_from = self._query_value(response.request.url, "from")
+        boundary = int(self._record_unix_time(records[-1]))
+        if current_from is not None and boundary <= float(current_from):
+            # A whole query worth of records share one second: step past it.
+            self.logger.warning(
+                f"More than {self.max_pagination_depth} records at {boundary}, "
+                "some of them may be skipped."
+            )
+            boundary += 1
+        seen_ids = {
+            record.get("id")
+            for record in records
+            if self._record_unix_time(record) == boundary
+        }
+        with self._boundary_lock:
+            # Kept for the rest of the run: pages of the previous query may
+            # still wait in the prefetch buffer.
+            self._boundary_ids[float(boundary)] = seen_ids
+        self.logger.info(
+            f"Pagination depth limit reached at page {page - 1}, "
+            f"restarting from {boundary}."
+        )
+        base_url = next_page_link.split("?", 1)[0]
+        return f"{base_url}?page=1&per_page={per_page}&query_from={boundary}"
+
     def get_url_params(
             self, context: Optional[dict], next_page_token: Optional[Any]
     ) -> Dict[str, Any]:
         """Return a dictionary of values to be used in URL parameterization."""
-        params: dict = {}
+        params: dict = {"per_page": self.page_size}
         if next_page_token:
-            # format next_page_token: "https://api.aircall.io/v1/calls?page=2&per_page=20"
-            # page & per_page require int params
+            # format next_page_token:
+            # "https://api.aircall.io/v1/calls?page=2&per_page=20"
+            # page requires an int param, per_page is always set from `page_size`
             # extract query from next_page_token string
             next_page_token_query: Dict = parse_qs(urlparse(next_page_token).query)
-            params["page"] = int(next_page_token_query.get('page', ['1'])[0])  # Default si 1
-            params["per_page"] = int(next_page_token_query.get('per_page', ['20'])[0])  # Default is 20
+            # Default is 1
+            params["page"] = int(next_page_token_query.get('page', ['1'])[0])
+            # `from` of the query the page belongs to, see `get_next_page_token`
+            query_from = next_page_token_query.get('query_from')
         if self.replication_key:
             params["order"] = "asc"
             # params["order_by"] = self.replication_key
@@ -85,63 +780,285 @@ class aircallStream(RESTStream):
         # Aircall API expects Epoch or Unix Timestamp vs ISO datetime
         # get replication key from bookmark
         
-        starting_time = self.get_starting_timestamp(context)
-        starting_unix_time = starting_time.timestamp()
+        starting_time = self.get_starting_timestamp(context) or self.start_date
+        starting_unix_time = starting_time.timestamp() if starting_time else None
         
-        if starting_unix_time:
+        checkpoint_from = None
+        if not next_page_token:
+            checkpoint_from = self._resume_from_checkpoint(context)
+
+        if next_page_token and query_from:
+            query_from_value = float(query_from[0])
+            params["from"] = (
+                int(query_from_value) if query_from_value.is_integer()
+                else query_from_value
+            )
+        elif checkpoint_from and checkpoint_from > (starting_unix_time or 0):
+            params["from"] = checkpoint_from
+        elif starting_unix_time:
             params["from"] = starting_unix_time
         else:
             #Unix Timestamp
             params["from"] = time.time()
 
         return params
-    
-    def prepare_request_payload(
-            self, context: Optional[dict], next_page_token: Optional[Any]
-    ) -> Optional[dict]:
-        """Prepare the data payload for the REST API request.
-        By default, no payload will be sent (return None).
+
+    def response_payload(self, response: requests.Response) -> Any:
+        """Return the decoded JSON body of the response, decoding it only once.
+
+        The payload is cached on the response object itself so that
+        `parse_response` and `get_next_page_token` share a single decode.
         """
-        # TODO: Delete this method if no payload is required. (Most REST APIs.)
-        return None
+        payload = getattr(response, "_aircall_payload", None)
+        if payload is None:
+            metrics = self.metrics
+            started = time.perf_counter()
+            payload = response.json()
+            response._aircall_payload = payload  # type: ignore[attr-defined]
+            if metrics is not None:
+                metrics.add("parse_seconds", time.perf_counter() - started)
+        return payload
+
+    def _page_records(self, response: requests.Response) -> list:
+        """Return the records of a page, without any JSONPath when possible."""
+        payload = self.response_payload(response)
+        if self.records_key:
+            return payload.get(self.records_key) or []
+        return list(extract_jsonpath(self.records_jsonpath, input=payload))
+
+    def _stream_page_records(self, response: requests.Response) -> Iterable[dict]:
+        """Decode the records of a streamed page one at a time.
+
+        Once the body is read, the other top-level values (`meta`) and the
+        records sharing the last replication key value are cached as the
+        response payload, for `get_next_page_token` and
+        `_split_deep_pagination`.
+        """
+        payload: dict = {}
+        tail: list = []
+        tail_value = None
+        for record in self._streamed_records(response, payload):
+            if self.replication_key:
+                value = record.get(self.replication_key)
+                if value != tail_value:
+                    tail, tail_value = [], value
+                tail.append(record)
+            yield record
+        self._set_streamed_payload(response, payload, tail)
+
+    def _streamed_records(
+            self, response: requests.Response, payload: dict
+    ) -> Iterable[dict]:
+        """Yield the records of a streamed body, setting its other values.
+
+        A body cut by the connection is requested again, up to
+        `backoff_max_tries` times, skipping the records already yielded.
+        """
+        yielded = 0
+        tries = 1
+        body = response
+        try:
+            while True:
+                try:
+                    for record in self._body_records(body, payload, yielded):
+                        yielded += 1
+                        yield record
+                    return
+                except (
+                    requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError,
+                ) as ex:
+                    if tries >= self.backoff_max_tries():
+                        raise
+                    tries += 1
+                    self.logger.warning(
+                        f"Body of {response.request.url} cut after {yielded} "
+                        f"records ({ex}), requesting the page again."
+                    )
+                    if self.metrics is not None:
+                        self.metrics.add("retries")
+                    body.close()
+                    body = self.request_decorator(self._send)(response.request, None)
+        finally:
+            body.close()
+
+    def _body_records(
+            self, body: requests.Response, payload: dict, skip: int
+    ) -> Iterable[dict]:
+        """Return the records of a body after the first `skip` ones."""
+        chunks = body.iter_content(chunk_size=65536)
+        metrics = self.metrics
+        if metrics is not None:
+            chunks = self._measured_chunks(chunks, metrics)
+        records = iter_json_records(chunks, self.records_key, payload.__setitem__)
+        return itertools.islice(records, skip, None)
+
+    def _set_streamed_payload(
+            self, response: requests.Response, payload: dict, tail: list
+    ) -> None:
+        """Cache the values of a streamed body, for the next page token."""
+        meta = payload.get("meta")
+        self.logger.info(f"meta: {list(meta.values()) if meta else []}")
+        payload[self.records_key] = tail
+        response._aircall_payload = payload  # type: ignore[attr-defined]
+
+    @staticmethod
+    def _measured_chunks(
+            chunks: Iterable[bytes], metrics: StreamMetrics
+    ) -> Iterable[bytes]:
+        """Count the bytes of a streamed body, and the time spent reading it."""
+        iterator = iter(chunks)
+        while True:
+            started = time.perf_counter()
+            chunk = next(iterator, None)
+            # reading and decoding are interleaved, both count as parsing
+            metrics.add("parse_seconds", time.perf_counter() - started)
+            if chunk is None:
+                return
+            metrics.add("bytes", len(chunk))
+            yield chunk
 
     def parse_response(self, response: requests.Response) -> Iterable[dict]:
         """Parse the response and return an iterator of result rows."""
-        # TODO: Parse response body and return a set of records.
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.add("pages")
+        if self.stream_json:
+            records = self._stream_page_records(response)
+        else:
+            payload = self.response_payload(response)
+            meta = payload.get("meta") if isinstance(payload, dict) else None
+            self.logger.info(f"meta: {list(meta.values()) if meta else []}")
+            records = self._page_records(response)
+
+        query_from = self._query_value(response.request.url, "from")
+        seen_ids = query_from and self._boundary_ids.get(float(query_from))
+        if seen_ids:
+            # Records of a restarted query already emitted before the restart.
+            records = (r for r in records if r.get("id") not in seen_ids)
+        yield from records
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request records, fetching the next pages while this one is processed.
+
+        Up to `prefetch_pages` pages (and `prefetch_max_bytes` bytes) are read
+        ahead by a background thread; 0 disables prefetching. Streamed pages
+        are never read ahead, the next page link comes with the end of the body.
+        """
+        prefetch_pages = self.config.get("prefetch_pages", 2)
+        if not prefetch_pages or self.stream_json:
+            yield from super().request_records(context)
+            return
+        pages = PagePipeline(
+            lambda: self._request_pages(context),
+            max_pages=prefetch_pages,
+            max_bytes=self.config.get("prefetch_max_bytes", 64 * 1024 * 1024),
+        )
+        for response in pages:
+            yield from self.parse_response(response)
+
+    def _request_pages(self, context: Optional[dict]) -> Iterable[requests.Response]:
+        """Yield the responses of every page of the context, in order.
+
+        Same loop as the SDK's `request_records`: pages are counted in the
+        request counter metric and in the sync costs, and the SDK paginator
+        detects pagination loops.
+        """
+        paginator = self.get_new_paginator()
+        decorated_request = self.request_decorator(self._request)
+        with sdk_metrics.http_request_counter(self.name, self.path) as request_counter:
+            request_counter.context = context
+            while not paginator.finished:
+                prepared_request = self.prepare_request(
+                    context, next_page_token=paginator.current_value
+                )
+                response = decorated_request(prepared_request, context)
+                request_counter.increment()
+                self.update_sync_costs(prepared_request, response, context)
+                # decodes the page here, in the fetching thread
+                paginator.advance(response)
+                yield response
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return the records of a context, then drop its checkpoint."""
+        yield from self.fetch_records(context)
+        if self.replication_key:
+            self._clear_checkpoint(context)
+
+    def fetch_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request and post-process the records of a context."""
+        return super().get_records(context)
+
+    @property
+    def projection_keeps(self) -> List[str]:
+        """Return the properties kept whole whatever the catalog, for children."""
+        return []
 
-        self.logger.info(f"meta: {list(extract_jsonpath('$.meta.[*]', input=response.json()))}")
+    @property
+    def projection(self) -> Optional[Projection]:
+        """Return the projection of the catalog, compiled on first use.
 
-        yield from extract_jsonpath(self.records_jsonpath, input=response.json())
+        Properties the catalog deselects, nested ones included, are dropped
+        from the records by `post_process` before any other work.
+        """
+        if self._projection is _UNCOMPILED:
+            projection = compile_projection(self.schema, self.mask)
+            if projection is not None:
+                for key in self.projection_keeps:
+                    projection[key] = None
+            self._projection = projection
+        return self._projection
+
+    @property
+    def output_projection(self) -> Optional[Projection]:
+        """Return the projection of the catalog alone, applied to written records."""
+        if self._output_projection is _UNCOMPILED:
+            self._output_projection = compile_projection(self.schema, self.mask)
+        return self._output_projection
 
     def post_process(self, row: dict, context: Optional[dict]) -> dict:
         """As needed, append or transform raw data to match expected structure."""
-        # convert these values from type timestamp to datetime.
-        datetime_types = ["answered_at", "started_at", "ended_at"]
-        for key in datetime_types:
-            if key in row and row.get(key):
-                row[key] = datetime.fromtimestamp(row.get(key))
+        projection = self.projection
+        if projection is not None:
+            row = apply_projection(row, projection)
+        # Aircall sends most date-times (started_at, answered_at, ended_at,
+        # comments[].posted_at...) as unix timestamps: convert every date-time
+        # property of the schema, nested ones included, to ISO-8601 UTC.
+        if self._datetime_plan:
+            metrics = self.metrics
+            if metrics is None:
+                apply_datetime_plan(row, self._datetime_plan)
+                return row
+            started = time.perf_counter()
+            apply_datetime_plan(row, self._datetime_plan)
+            metrics.add("post_process_seconds", time.perf_counter() - started)
         return row
-    
-    """
-    # This code-block is not required when backoff_wait_generator code-block is active
-    def validate_response(self, response: requests.Response) -> None:
-        try:
-            super().validate_response(response)
-        except RetriableAPIError as e:
-             #Capture other Retriable Errors
-            if e.response.status_code == 429:
-                self.logger.error(f"(accepted intermittent error) Rate limit error: {e}")
-                sys.exit(1001)
-            else:
-                raise e
-    """
-    
-    #https://sdk.meltano.com/en/latest/code_samples.html#custom-backoff
-    #FUJ-4120, introducing custom backoff for Aircall taps
-    
-    #https://developer.aircall.io/tutorials/logging-calls/#:~:text=Aircall%20Public%20API%20is%20rate,will%20be%20blocked%20by%20Aircall.
-    #Aircall allows 60 requests per minute, generating a wait time of 90 seconds to avoid error caused by RateLimit exception
-    def backoff_wait_generator(max_time: int) -> Callable[..., Generator[int, Any, None]]:
-        return backoff.constant(interval=90)
-    
-    
+
+    def write_webhook_record(self, data: dict) -> None:
+        """Write the object of a webhook event, and move the bookmark up to it.
+
+        Events do not come in replication key order (`call.tagged` may follow
+        a newer `call.created`), so the bookmark only ever moves forward.
+        """
+        record = self.post_process(data, None)
+        if record is None:
+            return
+        self._write_webhook_children(record)
+        self._write_record_message(record)
+        if not self.replication_key or record.get(self.replication_key) is None:
+            return
+        with self._tap.state_lock:
+            state = self.get_context_state(None)
+            bookmark = state.get("replication_key_value")
+            if bookmark is None or self._record_unix_time(
+                record
+            ) > self._record_unix_time({self.replication_key: bookmark}):
+                state["replication_key"] = self.replication_key
+                state["replication_key_value"] = record[self.replication_key]
+
+    def _write_webhook_children(self, record: dict) -> None:
+        """Write what the child streams take from a record received by webhook."""
+
+    def backoff_wait_generator(self) -> Generator[float, None, None]:
+        """Return exponential waits on top of the rate limiter, up to 90 seconds."""
+        return backoff.expo(factor=2, max_value=90)
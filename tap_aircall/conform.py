@@ -0,0 +1,207 @@
+"""Record conformers and validators compiled once from a stream schema.
+
+The SDK conforms every record by looking up the JSON schema of each of its
+properties, and does not validate them. Here a stream schema is turned once
+into closures that only do the checks the schema calls for.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from singer_sdk.helpers._typing import conform_record_data_types, is_boolean_type
+
+# Types of the values decoded from JSON, conformed as they are by the SDK
+# unless they are properties of type boolean.
+_JSON_TYPES = frozenset((str, int, float, bool, dict, list, type(None)))
+
+Conformer = Callable[[dict], dict]
+Validator = Callable[[Any], List[str]]
+
+
+def compile_conformer(
+    stream_name: str,
+    schema: dict,
+    logger: logging.Logger,
+    context_keys: Iterable[str] = (),
+) -> Conformer:
+    """Return a function conforming records like `conform_record_data_types`.
+
+    Records holding properties missing from the schema, or values not decoded
+    from JSON (datetimes, bytes...), are handed to the SDK function itself.
+    The `context_keys` the SDK copies from the partition context to every
+    record are dropped first, when the schema does not have them.
+    """
+    properties = frozenset(schema.get("properties", {}))
+    booleans = frozenset(
+        key for key, prop in schema.get("properties", {}).items()
+        if is_boolean_type(prop)
+    )
+    dropped = frozenset(context_keys) - properties
+
+    def conform(record: dict) -> dict:
+        if dropped:
+            record = {
+                key: value for key, value in record.items() if key not in dropped
+            }
+        for key, value in record.items():
+            if key not in properties or type(value) not in _JSON_TYPES:
+                return conform_record_data_types(stream_name, record, schema, logger)
+        # the record filtered above is already a copy
+        conformed = record if dropped else dict(record)
+        for key in booleans.intersection(record):
+            value = conformed[key]
+            if value is not None:
+                conformed[key] = False if value == 0 else True
+        return conformed
+
+    return conform
+
+
+# Python types of the JSON values of each JSON schema type.
+_PYTHON_TYPES = {
+    "null": (type(None),),
+    "boolean": (bool,),
+    "integer": (int,),
+    "number": (int, float),
+    "string": (str,),
+    "object": (dict,),
+    "array": (list,),
+}
+
+# Checks a value, returning its errors, or None. Each error starts with the
+# path of the faulty value relative to the checked one, e.g. ".user.id: ...".
+_Check = Callable[[Any], Optional[List[str]]]
+
+
+def _no_check(value: Any) -> Optional[List[str]]:
+    return None
+
+
+def _compile_type(schema: dict) -> _Check:
+    """Return the check of the `type` of a schema."""
+    names = schema.get("type") or []
+    names = [names] if isinstance(names, str) else list(names)
+    if not names or not all(name in _PYTHON_TYPES for name in names):
+        return _no_check
+    allowed = frozenset(
+        python_type for name in names for python_type in _PYTHON_TYPES[name]
+    )
+    expected = "/".join(names)
+
+    def check_type(value: Any) -> Optional[List[str]]:
+        if type(value) not in allowed:
+            return [f": {type(value).__name__} is not {expected}"]
+        return None
+
+    return check_type
+
+
+def _compile_scalar(schema: dict) -> _Check:
+    """Return the check of the `type` and `enum` of a schema."""
+    check_type = _compile_type(schema)
+    enum = schema.get("enum")
+    if enum is None:
+        return check_type
+
+    def check_enum(value: Any) -> Optional[List[str]]:
+        errors = check_type(value)
+        if errors is None and value not in enum:
+            return [f": {value!r} is not one of {enum}"]
+        return errors
+
+    return check_enum
+
+
+def _compile_object(schema: dict) -> _Check:
+    """Return the check of an object schema, its properties included."""
+    check_value = _compile_scalar(schema)
+    properties: Dict[str, _Check] = {
+        key: _compile(prop) for key, prop in schema.get("properties", {}).items()
+    }
+    required = schema.get("required") or []
+
+    def check_object(value: Any) -> Optional[List[str]]:
+        errors = check_value(value)
+        if errors is not None or type(value) is not dict:
+            return errors
+        errors = [
+            f".{key}: required property missing" for key in required
+            if key not in value
+        ]
+        for key, sub_value in value.items():
+            check_property = properties.get(key)
+            if check_property is None:
+                continue
+            sub_errors = check_property(sub_value)
+            if sub_errors:
+                errors.extend(f".{key}{error}" for error in sub_errors)
+        return errors or None
+
+    return check_object
+
+
+def _compile_array(schema: dict) -> _Check:
+    """Return the check of an array schema, its items included."""
+    check_value = _compile_scalar(schema)
+    check_item = _compile(schema["items"])
+
+    def check_array(value: Any) -> Optional[List[str]]:
+        errors = check_value(value)
+        if errors is not None or type(value) is not list:
+            return errors
+        errors = []
+        for index, item in enumerate(value):
+            sub_errors = check_item(item)
+            if sub_errors:
+                errors.extend(f"[{index}]{error}" for error in sub_errors)
+        return errors or None
+
+    return check_array
+
+
+def _compile_any(schema: dict) -> _Check:
+    """Return the check of an `anyOf` schema."""
+    options = [_compile(option) for option in schema["anyOf"]]
+
+    def check_any(value: Any) -> Optional[List[str]]:
+        if any(not check_option(value) for check_option in options):
+            return None
+        return [f": {value!r} matches none of anyOf"]
+
+    return check_any
+
+
+# Compiler of each kind of schema, see `_compile`.
+_COMPILERS: Dict[str, Callable[[dict], _Check]] = {
+    "anyOf": _compile_any,
+    "object": _compile_object,
+    "array": _compile_array,
+    "scalar": _compile_scalar,
+}
+
+
+def _compile(schema: dict) -> _Check:
+    """Return the check of the values of a schema, paths built on errors only."""
+    if "anyOf" in schema:
+        kind = "anyOf"
+    elif "properties" in schema or "required" in schema:
+        kind = "object"
+    elif "items" in schema:
+        kind = "array"
+    else:
+        kind = "scalar"
+    return _COMPILERS[kind](schema)
+
+
+def compile_validator(schema: dict) -> Validator:
+    """Return a function listing how a record breaks a JSON schema.
+
+    Types, `enum`, `required`, `properties`, `items` and `anyOf` are checked;
+    formats and properties missing from the schema are not.
+    """
+    check = _compile(schema)
+
+    def validate(record: Any) -> List[str]:
+        return [f"${error}" for error in check(record) or ()]
+
+    return validate
@@ -0,0 +1,109 @@
+"""Incremental decoding of paged API responses."""
+
+import codecs
+import json
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+_WHITESPACE = " \t\n\r"
+_DECODER = json.JSONDecoder()
+
+
+class _Reader:
+    """Text buffer refilled from a byte stream, consumed from the left."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        """Append the next chunk to the buffer, return False at end of stream."""
+        if self.exhausted:
+            return False
+        if self.pos > 65536:
+            # drop what has been consumed already
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.buffer += self._decoder.decode(chunk)
+                return True
+        self.buffer += self._decoder.decode(b"", final=True)
+        self.exhausted = True
+        return False
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character, without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON document.")
+
+    def expect(self, characters: str) -> str:
+        """Consume and return the next character, which must be one of these."""
+        character = self.peek()
+        if character not in characters:
+            raise ValueError(
+                f"Expected one of {characters!r} at offset {self.pos}, "
+                f"found {character!r}."
+            )
+        self.pos += 1
+        return character
+
+    def value(self) -> Any:
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            if end == len(self.buffer) and not self.exhausted:
+                # a number may continue in the next chunk
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_records(
+    chunks: Iterable[bytes],
+    records_key: str,
+    on_value: Optional[Callable[[str, Any], None]] = None,
+) -> Iterator[Any]:
+    """Yield the items of `document[records_key]` one at a time.
+
+    `chunks` is the byte stream of a JSON object, e.g.
+    `response.iter_content(65536)`. Only one item is held in memory at a time;
+    the other top-level values (such as `meta`) are passed to `on_value` as
+    they are read.
+    """
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == records_key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.expect("]")
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        else:
+            value = reader.value()
+            if on_value is not None:
+                on_value(key, value)
+        if reader.expect(",}") == "}":
+            return
@@ -0,0 +1,170 @@
+"""Performance metrics of a sync, and a sampling profiler.
+
+Both are off unless asked for on the command line (`--metrics-file`,
+`--profile`); streams then only pay for a `None` check.
+"""
+
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class Histogram:
+    """Counts of observed values by upper bound, with their sum and maximum."""
+
+    # seconds, from a local request to a rate-limited retry
+    bounds = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self) -> None:
+        """Create an empty histogram."""
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """Count a value in the first bucket whose bound is not below it."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        """Return the histogram, with the bucket counts keyed by upper bound."""
+        labels = [str(bound) for bound in self.bounds] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+        }
+
+
+class StreamMetrics:
+    """Counters and histograms of one stream, updated from any thread.
+
+    Counters: `requests`, `bytes`, `pages`, `records`, `retries`,
+    `backoff_seconds`, `rate_limit_wait_seconds`, `parse_seconds`,
+    `post_process_seconds` and `emit_seconds`. Histograms: `request_seconds`.
+    """
+
+    def __init__(self) -> None:
+        """Create metrics with every counter at zero."""
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def add(self, name: str, value: float = 1) -> None:
+        """Add `value` to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """Count a value in a histogram."""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def to_dict(self) -> dict:
+        """Return the counters and histograms."""
+        with self._lock:
+            return {
+                "counters": {
+                    name: round(value, 6) if isinstance(value, float) else value
+                    for name, value in sorted(self.counters.items())
+                },
+                "histograms": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(self.histograms.items())
+                },
+            }
+
+
+class SyncMetrics:
+    """The metrics of every stream of a run."""
+
+    def __init__(self) -> None:
+        """Start measuring a run."""
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        self._streams: Dict[str, StreamMetrics] = {}
+
+    def stream(self, name: str) -> StreamMetrics:
+        """Return the metrics of a stream."""
+        with self._lock:
+            metrics = self._streams.get(name)
+            if metrics is None:
+                metrics = self._streams[name] = StreamMetrics()
+            return metrics
+
+    def to_dict(self) -> dict:
+        """Return the metrics of the run, by stream."""
+        with self._lock:
+            streams = dict(self._streams)
+        return {
+            "elapsed_seconds": round(time.monotonic() - self._started, 6),
+            "streams": {
+                name: metrics.to_dict() for name, metrics in sorted(streams.items())
+            },
+        }
+
+    def write(self, path: str) -> None:
+        """Write the metrics as a JSON document."""
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+
+
+class SamplingProfiler:
+    """Sample the stacks of every thread at a fixed interval.
+
+    Unlike cProfile, the page fetching and window threads are sampled too.
+    `write()` saves the samples as folded stacks, one
+    `thread;outer_function;...;inner_function count` line per distinct stack,
+    as read by flamegraph.pl or speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        """Create a profiler taking a sample every `interval` seconds."""
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(
+            target=self._run, name="aircall-profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._stop.set()
+        assert self._thread is not None
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    module = Path(code.co_filename).stem
+                    stack.append(f"{module}.{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path: str) -> None:
+        """Write the samples as folded stacks."""
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        Path(path).write_text("\n".join(lines) + "\n")
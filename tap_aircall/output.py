@@ -0,0 +1,154 @@
+"""Singer message output helpers."""
+
+import io
+import json
+import queue
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, TextIO
+
+_STOP = object()
+
+
+class OrderedStdout(io.TextIOBase):
+    """Stand-in for `sys.stdout` serializing the output of concurrent streams.
+
+    Text written by a thread is buffered for that thread only and handed to a
+    single writer thread on `flush()`, which the Singer message writers call
+    after every message. Whole messages therefore never interleave, and each
+    thread's messages reach the real stdout in the order they were written:
+    a STATE message is only emitted after the records written before it.
+    """
+
+    def __init__(self, target: TextIO = None) -> None:
+        """Create a writer forwarding to `target`, `sys.stdout` by default."""
+        super().__init__()
+        self._target = target
+        self._local = threading.local()
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._writer = threading.Thread(
+            target=self._run, name="aircall-stdout", daemon=True
+        )
+        self._error: BaseException = None
+
+    def _buffer(self) -> List[str]:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = []
+        return buffer
+
+    def writable(self) -> bool:
+        """Return True, this stream accepts writes."""
+        return True
+
+    def write(self, text: str) -> int:
+        """Buffer `text` until the calling thread flushes."""
+        self._buffer().append(text)
+        return len(text)
+
+    def flush(self) -> None:
+        """Hand the calling thread's buffered messages to the writer thread."""
+        buffer = self._buffer()
+        if buffer:
+            self._queue.put("".join(buffer))
+            buffer.clear()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            if chunk is _STOP:
+                return
+            try:
+                self._target.write(chunk)
+                self._target.flush()
+            except BaseException as ex:  # e.g. the target closed its end
+                self._error = ex
+
+    def __enter__(self) -> "OrderedStdout":
+        if self._target is None:
+            self._target = sys.stdout
+        self._saved_stdout = sys.stdout
+        sys.stdout = self
+        self._writer.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        try:
+            self.flush()
+        finally:
+            self._queue.put(_STOP)
+            self._writer.join()
+            sys.stdout = self._saved_stdout
+
+
+def _json_dumps(message: Dict[str, Any]) -> str:
+    # same separators and escaping as the SDK writer
+    return json.dumps(message, default=str)
+
+
+def _orjson_dumps(message: Dict[str, Any]) -> str:
+    import orjson
+
+    return orjson.dumps(message, default=str).decode("utf-8")
+
+
+ENCODERS: Dict[str, Callable[[Dict[str, Any]], str]] = {
+    "json": _json_dumps,
+    "orjson": _orjson_dumps,
+}
+
+
+class RecordWriter:
+    """Writer of RECORD messages, encoded directly and written in batches.
+
+    The SDK deep-copies every record into a new message dict before encoding
+    it, then flushes stdout after each message. Here the message dict wraps
+    the record as is, and lines are written once `batch_bytes` of them are
+    pending. With the "json" encoder the lines are byte for byte those of the
+    SDK; "orjson" writes compact JSON and needs the `orjson` package.
+
+    Any other message must only be written after `flush()`, so that a STATE
+    message never reaches stdout before the records it covers.
+    """
+
+    def __init__(self, encoder: str = "json", batch_bytes: int = 1024 * 1024) -> None:
+        """Create a writer using one of `ENCODERS`."""
+        if encoder == "orjson":
+            import orjson  # noqa: F401  # fail now rather than on the first record
+        self._dumps = ENCODERS[encoder]
+        self._batch_bytes = batch_bytes
+        self._batch: List[str] = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self.messages = 0
+
+    def write(
+        self, stream: str, record: dict, time_extracted: Optional[datetime] = None
+    ) -> None:
+        """Queue the RECORD message of `record`."""
+        message: Dict[str, Any] = {"type": "RECORD", "stream": stream, "record": record}
+        if time_extracted is not None:
+            # pre-encoded the way the SDK writer does
+            message["time_extracted"] = str(time_extracted)
+        line = self._dumps(message) + "\n"
+        with self._lock:
+            self._batch.append(line)
+            self._size += len(line)
+            self.messages += 1
+            if self._size >= self._batch_bytes:
+                self._write_batch()
+
+    def flush(self) -> None:
+        """Write the pending messages to stdout."""
+        with self._lock:
+            self._write_batch()
+
+    def _write_batch(self) -> None:
+        if self._batch:
+            sys.stdout.write("".join(self._batch))
+            self._batch.clear()
+            self._size = 0
+        sys.stdout.flush()
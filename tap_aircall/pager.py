@@ -0,0 +1,88 @@
+"""Background page fetching with bounded read-ahead."""
+
+import threading
+from collections import deque
+from typing import Callable, Deque, Iterable, Iterator, Tuple
+
+import requests
+
+_DONE = object()
+
+
+class PagePipeline:
+    """Fetch the pages of a query in a background thread, ahead of processing.
+
+    While the caller processes page N, the next pages are requested and
+    decoded. At most `max_pages` pages, or `max_bytes` bytes of response
+    bodies, wait in the buffer: when the caller falls behind (e.g. because the
+    target reads stdout slowly) fetching pauses, so memory stays flat. A single
+    page larger than `max_bytes` is still let through when the buffer is empty.
+    """
+
+    def __init__(
+        self,
+        fetch_pages: Callable[[], Iterable[requests.Response]],
+        max_pages: int = 2,
+        max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        """Create a pipeline over the pages yielded by `fetch_pages()`."""
+        self._fetch_pages = fetch_pages
+        self._max_pages = max(max_pages, 1)
+        self._max_bytes = max_bytes
+        self._buffer: Deque[Tuple[object, int]] = deque()
+        self._buffered_bytes = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def _put(self, item: object, size: int) -> bool:
+        with self._condition:
+            while not self._closed and self._buffer and (
+                len(self._buffer) >= self._max_pages
+                or self._buffered_bytes + size > self._max_bytes
+            ):
+                self._condition.wait()
+            if self._closed:
+                return False
+            self._buffer.append((item, size))
+            self._buffered_bytes += size
+            self._condition.notify_all()
+            return True
+
+    def _run(self) -> None:
+        pages = self._fetch_pages()
+        try:
+            for response in pages:
+                if not self._put(response, len(response.content or b"")):
+                    return
+        except BaseException as ex:  # re-raised in the consuming thread
+            self._put(ex, 0)
+            return
+        finally:
+            # e.g. ends the request counter of a generator left early
+            close = getattr(pages, "close", None)
+            if close is not None:
+                close()
+        self._put(_DONE, 0)
+
+    def __iter__(self) -> Iterator[requests.Response]:
+        """Yield the pages in order, re-raising errors of the fetching thread."""
+        thread = threading.Thread(target=self._run, name="aircall-pager", daemon=True)
+        thread.start()
+        try:
+            while True:
+                with self._condition:
+                    while not self._buffer:
+                        self._condition.wait()
+                    item, size = self._buffer.popleft()
+                    self._buffered_bytes -= size
+                    self._condition.notify_all()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            with self._condition:
+                self._closed = True
+                self._buffer.clear()
+                self._condition.notify_all()
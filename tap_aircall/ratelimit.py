@@ -0,0 +1,104 @@
+"""Client-side rate limiting driven by the Aircall rate-limit headers."""
+
+import threading
+import time
+from typing import Callable, Mapping, Optional
+
+# https://developer.aircall.io/api-references/#rate-limiting
+LIMIT_HEADER = "X-AircallApi-Limit"
+REMAINING_HEADER = "X-AircallApi-Remaining"
+RESET_HEADER = "X-AircallApi-Reset"
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+# Used when a 429 arrives without any reset information.
+DEFAULT_THROTTLE_SECONDS = 60.0
+
+
+def _header_float(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """Thread-safe limiter pacing requests evenly across the API budget.
+
+    Requests are scheduled one `interval` apart (plus an optional burst). The
+    interval widens when the `X-AircallApi-Remaining` header shows that the
+    budget left until `X-AircallApi-Reset` is smaller than expected, e.g.
+    because another client shares the same credentials. A 429 blocks every
+    caller until the reset time, and not a second longer.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        """Create a limiter allowing `requests_per_minute`, `burst` at once."""
+        # the configured budget stays a ceiling whatever the API allows
+        self._configured_interval = 60.0 / requests_per_minute
+        self._base_interval = self._configured_interval
+        self._interval = self._base_interval
+        self._burst = max(burst, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        # Theoretical arrival time of the next request (GCRA).
+        self._next_slot = clock()
+        self._blocked_until = 0.0
+        self.wait_seconds = 0.0
+
+    @property
+    def interval(self) -> float:
+        """Return the current number of seconds between two requests."""
+        return self._interval
+
+    def acquire(self) -> float:
+        """Block until a request may be sent, returning the seconds waited."""
+        with self._lock:
+            now = self._clock()
+            tolerance = (self._burst - 1) * self._interval
+            next_slot = max(self._next_slot, now)
+            start = max(now, next_slot - tolerance, self._blocked_until)
+            self._next_slot = max(next_slot, start) + self._interval
+            wait = start - now
+            self.wait_seconds += wait
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def update(self, headers: Mapping[str, str], status_code: int = 200) -> None:
+        """Adapt the pace to the rate-limit headers of a response."""
+        limit = _header_float(headers, LIMIT_HEADER)
+        remaining = _header_float(headers, REMAINING_HEADER)
+        reset = _header_float(headers, RESET_HEADER)
+
+        with self._lock:
+            now = self._clock()
+            if limit:
+                self._base_interval = max(60.0 / limit, self._configured_interval)
+            seconds_to_reset = None
+            if reset is not None:
+                seconds_to_reset = max(reset - time.time(), 0.0)
+
+            if status_code == 429 or remaining == 0:
+                if seconds_to_reset is None:
+                    retry_after = _header_float(headers, "Retry-After")
+                    seconds_to_reset = (
+                        retry_after
+                        if retry_after is not None
+                        else DEFAULT_THROTTLE_SECONDS
+                    )
+                self._blocked_until = max(self._blocked_until, now + seconds_to_reset)
+                self._interval = self._base_interval
+            elif remaining is not None and seconds_to_reset is not None:
+                self._interval = max(
+                    self._base_interval, seconds_to_reset / remaining
+                )
+            else:
+                self._interval = self._base_interval
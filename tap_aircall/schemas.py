@@ -1,6 +1,18 @@
+"""Stream schemas, compiled to the JSON files of `schemas/`.
+
+The tap loads those files at run time instead of building the schemas below.
+Regenerate them after any change with ``python -m tap_aircall.schemas``.
+"""
+
+import json
+from pathlib import Path
+from typing import Callable, Dict
+
 from singer_sdk.typing import PropertiesList, Property, IntegerType, StringType, BooleanType, ArrayType, ObjectType, \
     EmailType, DateTimeType
 
+from tap_aircall.streams import call_references
+
 number_properties = PropertiesList(
     Property("id", IntegerType, required=True, description="Unique identifier for the Number."),
     Property("direct_link", StringType, description="Direct API URL."),
@@ -157,7 +169,7 @@ call_properties = PropertiesList(
     Property("comments", ArrayType(ObjectType(
         Property("id", IntegerType, description="Unique identifier for the Comment."),
         Property("content", StringType, description="Content of the Comment, written by Agent or via Public API."),
-        Property("posted_at", IntegerType, description="UNIX timestamp when the Comment was created, in UTC."),
+        Property("posted_at", DateTimeType, description="Timestamp when the Comment was created, in UTC."),
         Property("posted_by", user_properties, description="User object who created the Comment.")
     ))),
     Property("tags", ArrayType(tag_properties), description="Tags added to this Call by Users."),
@@ -168,3 +180,62 @@ call_properties = PropertiesList(
         Property("phone_number", StringType, description="Not present in a user type participant")
     )), description="Participants involved in a conference call."),
 )
+
+call_reference_properties = PropertiesList(
+    Property("number_id", IntegerType, description="Id of the Number attached to the Call."),
+    Property("user_id", IntegerType, description="Id of the User who took or made the Call."),
+    Property("contact_id", IntegerType, description="Id of the Contact attached to the Call."),
+    Property("assigned_to_id", IntegerType, description="Id of the User assigned to the Call."),
+    Property("team_ids", ArrayType(IntegerType), description="Ids of the Teams assigned to the Call."),
+    Property("transferred_by_id", IntegerType, description="Id of the User who performed the Call transfer."),
+    Property("transferred_to_id", IntegerType, description="Id of the User to whom the Call was transferred to."),
+    Property("tag_ids", ArrayType(IntegerType), description="Ids of the Tags added to this Call by Users."),
+)
+
+call_asset_properties = PropertiesList(
+    Property("call_id", IntegerType, required=True, description="Id of the Call the file belongs to."),
+    Property("kind", StringType, required=True, description="recording or voicemail."),
+    Property("path", StringType, description="Where the file is stored."),
+    Property("size", IntegerType, description="Size of the file, in bytes."),
+    Property("sha256", StringType, description="SHA-256 checksum of the file, in hex."),
+    Property("downloaded", BooleanType, description="false if the file was already stored and not downloaded again."),
+)
+
+
+def normalized_call_schema() -> dict:
+    """Return the call schema with the embedded objects replaced by their ids."""
+    schema = call_properties.to_dict()
+    for key in call_references:
+        schema["properties"].pop(key)
+    schema["properties"].update(call_reference_properties.to_dict()["properties"])
+    return schema
+
+
+SCHEMAS_DIR = Path(__file__).parent / "schemas"
+
+SCHEMA_FILES: Dict[str, Callable[[], dict]] = {
+    "call_assets.json": call_asset_properties.to_dict,
+    "calls.json": call_properties.to_dict,
+    "calls_normalized.json": normalized_call_schema,
+    "contacts.json": contact_properties.to_dict,
+    "numbers.json": number_properties.to_dict,
+    "tags.json": tag_properties.to_dict,
+    "teams.json": teams_properties.to_dict,
+    "users.json": user_properties.to_dict,
+}
+
+
+def render_schema(name: str) -> str:
+    """Return the content of a schema file."""
+    return json.dumps(SCHEMA_FILES[name](), indent=2, ensure_ascii=False) + "\n"
+
+
+def write_schema_files(directory: Path = SCHEMAS_DIR) -> None:
+    """Write every schema file to `directory`."""
+    directory.mkdir(exist_ok=True)
+    for name in SCHEMA_FILES:
+        (directory / name).write_text(render_schema(name), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    write_schema_files()
@@ -1,9 +1,29 @@
 """Stream type classes for tap-aircall."""
 
-from typing import Optional
+import hashlib
+import json
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
 
-from tap_aircall.client import aircallStream
-from .schemas import user_properties, call_properties
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_aircall.assets import STORAGES, AssetDownloader
+from tap_aircall.client import SCHEMAS_DIR, aircallStream, unix_to_iso
+from tap_aircall.windows import PartitionPrefetcher, time_windows
+
+# Objects embedded in a call and the foreign keys replacing them in the
+# normalized output (`normalize_calls`).
+call_references = {
+    "number": "number_id",
+    "user": "user_id",
+    "contact": "contact_id",
+    "assigned_to": "assigned_to_id",
+    "teams": "team_ids",
+    "transferred_by": "transferred_by_id",
+    "transferred_to": "transferred_to_id",
+    "tags": "tag_ids",
+}
 
 
 class UsersStream(aircallStream):
@@ -12,15 +32,67 @@ class UsersStream(aircallStream):
     path = "v1/users"
     primary_keys = ["id"]
     replication_key = "created_at"
-    schema = user_properties.to_dict()
+    schema_filepath = SCHEMAS_DIR / "users.json"
     records_jsonpath = "$.users[*]"  # Or override `parse_response`.
+    batched = True
 
     def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
         """Return a context dictionary for child streams."""
         return {
-            "user_id": record["id"]
+            "user_id": record["id"],
+            "listing_hash": record_hash(record),
         }
 
+    def _user_stream(self) -> Optional["UserStream"]:
+        """Return the detail stream, if `user_details` adds it and it is selected."""
+        for child_stream in self.child_streams:
+            if isinstance(child_stream, UserStream) and child_stream.selected:
+                return child_stream
+        return None
+
+    def fetch_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return the users, fetching the details of the next ones concurrently.
+
+        Users are held back `2 * user_workers` records, while `UserStream`
+        requests the details of the ones changed since the last run.
+        """
+        user_stream = self._user_stream()
+        if user_stream is None:
+            yield from super().fetch_records(context)
+            return
+        lookahead: Deque[dict] = deque()
+        try:
+            for record in super().fetch_records(context):
+                child_context = self.get_child_context(record, context)
+                if not user_stream.unchanged(child_context):
+                    user_stream.prefetch(child_context)
+                lookahead.append(record)
+                if len(lookahead) > 2 * user_stream.workers:
+                    yield lookahead.popleft()
+            while lookahead:
+                yield lookahead.popleft()
+        finally:
+            user_stream.close_prefetcher()
+
+    def _sync_children(self, child_context: dict) -> None:
+        user_stream = self._user_stream()
+        if user_stream is not None and user_stream.unchanged(child_context):
+            return
+        super()._sync_children(child_context)
+
+
+def _prune_index(index: Dict[str, list], horizon: float) -> None:
+    """Drop the `content_hashes` of the calls started before `horizon`."""
+    for key in [key for key, entry in index.items() if entry[0] < horizon]:
+        del index[key]
+
+
+def record_hash(record: dict) -> str:
+    """Return a digest of a record, stable from one run to the next."""
+    content = json.dumps(record, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.md5(content).hexdigest()
+
+
 class CallsStream(aircallStream):
     """Define custom stream."""
     name = "calls"
@@ -32,8 +104,392 @@ class CallsStream(aircallStream):
     #replication_key = "id"
     replication_key = "started_at"
     
-    schema = call_properties.to_dict()
+    schema_filepath = SCHEMAS_DIR / "calls.json"
     records_jsonpath = "$.calls[*]"  # Or override `parse_response`.
+    batched = True
+    # the time window of `partitions`
+    context_keys = ("from", "to")
+
+    _prefetcher: Optional[PartitionPrefetcher] = None
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the stream, with foreign keys only when `normalize_calls`."""
+        super().__init__(*args, **kwargs)
+        if self.config.get("normalize_calls"):
+            # the date-time plan of the full schema still converts the
+            # embedded objects, before they move to their own streams
+            self._schema = self.with_account_property(
+                json.loads((SCHEMAS_DIR / "calls_normalized.json").read_text())
+            )
+
+    @property
+    def partitions(self) -> Optional[List[dict]]:
+        """Return one context per time window when `window_days` is configured.
+
+        Each context is a `{"from": ..., "to": ...}` unix time range with its own
+        bookmark, so an interrupted backfill only resumes unfinished windows.
+        Windows start at the first one not complete after the last run.
+        """
+        window_days = self.config.get("window_days")
+        if not window_days:
+            return None
+        with self._tap.state_lock:
+            start = self._windows_from()
+        return time_windows(start, int(time.time()), int(window_days * 86400))
+
+    def _windows_from(self) -> int:
+        """Return the start of the first window to sync."""
+        stream_state = self.get_context_state(None)
+        if "windows_from" in stream_state:
+            return stream_state["windows_from"]
+        # e.g. the bookmark of a sync without windows
+        bookmark = stream_state.get("replication_key_value")
+        if bookmark:
+            return int(self._record_unix_time({self.replication_key: bookmark}))
+        if self.start_date:
+            return int(self.start_date.timestamp())
+        raise ConfigValidationError(
+            "window_days requires a start_date, or a state to resume from."
+        )
+
+    def finalize_state_progress_markers(self, state: Optional[dict] = None) -> None:
+        """Finalize the progress markers, then drop the completed windows.
+
+        The windows complete from the start on are replaced by the
+        `windows_from` of the stream state, the next run starts there.
+        """
+        super().finalize_state_progress_markers(state)
+        window_days = self.config.get("window_days")
+        if state or not window_days:
+            return
+        size = int(window_days * 86400)
+        with self._tap.state_lock:
+            stream_state = self.get_context_state(None)
+            start = self._windows_from()
+            partitions = stream_state.get("partitions", [])
+            complete = {
+                partition["context"].get("from")
+                for partition in partitions
+                if partition.get("window_complete")
+            }
+            while start in complete:
+                start += size
+            stream_state["windows_from"] = start
+            stream_state["partitions"] = [
+                partition
+                for partition in partitions
+                if partition["context"].get("to", start + 1) > start
+            ]
+
+    def get_url_params(
+            self, context: Optional[dict], next_page_token: Optional[Any]
+    ) -> Dict[str, Any]:
+        """Restrict the query to the time window of the partition, if any."""
+        params = super().get_url_params(context, next_page_token)
+        if context and "from" in context:
+            params["from"] = max(params["from"], context["from"])
+            params["to"] = min(context["to"], int(time.time()))
+        return params
+
+    @property
+    def lookback(self) -> float:
+        """Return the configured `lookback_days`, in seconds."""
+        return float(self.config.get("lookback_days") or 0) * 86400
+
+    def _write_starting_replication_value(self, context: Optional[dict]) -> None:
+        """Start `lookback_days` before the bookmark, to re-read recent calls.
+
+        Calls keep changing after they start (`ended_at`, `tags`, `comments`,
+        `assigned_to`...), and the bookmark alone would never revisit them.
+        """
+        bookmarked = self.get_context_state(context).get("replication_key_value")
+        super()._write_starting_replication_value(context)
+        if not (self.lookback and bookmarked):
+            return
+        state = self.get_context_state(context)
+        start = self._record_unix_time(
+            {self.replication_key: state["starting_replication_value"]}
+        ) - self.lookback
+        if self.start_date:
+            start = max(start, self.start_date.timestamp())
+        state["starting_replication_value"] = unix_to_iso(int(start))
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return the records of a context, only the changed ones on lookback."""
+        if context and "from" in context:
+            records = self._window_records(context)
+        else:
+            records = super().get_records(context)
+        if self.lookback:
+            records = self._changed_records(records, context)
+        assets_stream = self._assets_stream()
+        if assets_stream is None:
+            yield from records
+            return
+        try:
+            yield from records
+            # the downloads of the context are written before its state
+            assets_stream.write_downloaded(wait=True)
+        finally:
+            assets_stream.close_downloader()
+
+    def _changed_records(
+            self, records: Iterable[dict], context: Optional[dict]
+    ) -> Iterable[dict]:
+        """Drop the records written before with the same content.
+
+        The `content_hashes` of the context state map the id of every call
+        started within `lookback_days` of the latest one to its start time and
+        a digest of its content. Older calls will not be read again: they are
+        not indexed, and pruned whenever the index doubles, so that the STATE
+        messages stay the size of the lookback. Dropped records still advance
+        the bookmark, which would otherwise fall back to the last changed call.
+        """
+        state_lock = self._tap.state_lock
+        with state_lock:
+            index = self.get_context_state(context).setdefault("content_hashes", {})
+            latest = max((entry[0] for entry in index.values()), default=0)
+            compact_at = max(2 * len(index), 100)
+        for record in records:
+            key = str(record["id"])
+            digest = record_hash(record)[:16]
+            started = int(self._record_unix_time(record) or 0)
+            with state_lock:
+                entry = index.get(key)
+                if entry and entry[1] == digest:
+                    # the bookmark still moves past the calls not written again
+                    self._increment_stream_state(record, context=context)
+                    continue
+                latest = max(latest, started)
+                if started >= latest - self.lookback:
+                    index[key] = [started, digest]
+                if len(index) >= compact_at:
+                    _prune_index(index, latest - self.lookback)
+                    compact_at = max(2 * len(index), 100)
+            yield record
+        with state_lock:
+            _prune_index(index, latest - self.lookback)
+
+    def _window_records(self, context: dict) -> Iterable[dict]:
+        """Return the records of a window, fetched concurrently with the others."""
+        window_state = self.get_context_state(context)
+        if window_state.get("window_complete"):
+            self.logger.info(f"Skipping completed window {context}.")
+            return
+
+        if self._prefetcher is None:
+            self._prefetcher = PartitionPrefetcher(
+                self.fetch_records, max_workers=self.config.get("max_workers", 4)
+            )
+            partitions = [
+                partition
+                for partition in self.partitions or []
+                if not self.get_context_state(partition).get("window_complete")
+            ]
+            with self._tap.state_lock:
+                for partition in partitions:
+                    # the workers query from the bookmark of their window, only
+                    # written by the SDK once the window's turn comes
+                    self._write_starting_replication_value(partition)
+            self._prefetcher.submit(partitions)
+        try:
+            yield from self._prefetcher.records(context)
+        except BaseException:
+            self._prefetcher.close()
+            self._prefetcher = None
+            raise
+        if not self._prefetcher.pending:
+            self._prefetcher.close()
+            self._prefetcher = None
+
+        # Every record of the window has been written: a window that lies
+        # entirely in the past (and out of the lookback) will not change.
+        self._clear_checkpoint(context)
+        if context["to"] <= time.time() - self.lookback:
+            window_state["window_complete"] = True
+
+    def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
+        """Return the id and asset URLs of a call, and its embedded objects.
+
+        In normalized mode the embedded objects are moved out of the call and
+        replaced by their ids, then handed to the dimension streams by
+        `_sync_children` before the call is written.
+        """
+        child_context = {
+            "call_id": record["id"],
+            "assets": {kind: record.get(kind) for kind in ("recording", "voicemail")},
+        }
+        if not self.config.get("normalize_calls"):
+            return child_context
+        embedded = {}
+        for key, foreign_key in call_references.items():
+            value = record.pop(key, None)
+            if isinstance(value, list):
+                record[foreign_key] = [item.get("id") for item in value]
+            else:
+                record[foreign_key] = value.get("id") if value else None
+            embedded[key] = value
+        child_context["embedded"] = embedded
+        return child_context
+
+    def _write_webhook_children(self, record: dict) -> None:
+        if self.config.get("normalize_calls"):
+            # assets are only downloaded by syncs
+            embedded = self.get_child_context(record, None)["embedded"]
+            self._sync_children({"embedded": embedded})
+
+    @property
+    def projection_keeps(self) -> List[str]:
+        """Return the properties the selected child streams take from calls."""
+        keeps = []
+        if self.config.get("normalize_calls"):
+            keeps += list(call_references)
+        if self._assets_stream() is not None:
+            keeps += ["recording", "voicemail"]
+        return keeps
+
+    def _assets_stream(self) -> Optional["CallAssetsStream"]:
+        for child_stream in self.child_streams:
+            if isinstance(child_stream, CallAssetsStream) and child_stream.selected:
+                return child_stream
+        return None
+
+    def _sync_children(self, child_context: dict) -> None:
+        for child_stream in self.child_streams:
+            if not child_stream.selected:
+                continue
+            if isinstance(child_stream, CallAssetsStream):
+                if "assets" in child_context:
+                    child_stream.download(child_context)
+            elif "embedded" in child_context:
+                child_stream.write_embedded(
+                    child_context["embedded"].get(child_stream.embedded_key)
+                )
+
+
+class CallDimensionStream(aircallStream):
+    """Objects embedded in calls, written once each when `normalize_calls` is set.
+
+    Records are not requested but handed over by `CallsStream` as it syncs, and
+    written again only when their content changed during the run.
+    """
+    parent_stream_type = CallsStream
+    primary_keys = ["id"]
+    state_partitioning_keys = []
+    # key of the object, or list of objects, in a call record
+    embedded_key = ""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the stream and its index of written records."""
+        super().__init__(*args, **kwargs)
+        # content hash of the last record written, by id
+        self._written: Dict[Any, int] = {}
+        self._schema_written = False
+
+    def write_embedded(self, value: Any) -> None:
+        """Write the records of an embedded object or list not written yet."""
+        if not value:
+            return
+        for record in value if isinstance(value, list) else [value]:
+            digest = hash(json.dumps(record, sort_keys=True))
+            if self._written.get(record.get("id")) == digest:
+                continue
+            self._written[record.get("id")] = digest
+            if not self._schema_written:
+                self._write_schema_message()
+                self._schema_written = True
+            self._write_record_message(record)
+
+    def write_webhook_record(self, data: dict) -> None:
+        """Write the object of a webhook event, unless written as is already."""
+        record = self.post_process(data, None)
+        if record is not None:
+            self.write_embedded(record)
+
+
+class NumbersStream(CallDimensionStream):
+    """Numbers attached to calls."""
+    name = "numbers"
+    schema_filepath = SCHEMAS_DIR / "numbers.json"
+    embedded_key = "number"
+
+
+class TeamsStream(CallDimensionStream):
+    """Teams assigned to calls."""
+    name = "teams"
+    schema_filepath = SCHEMAS_DIR / "teams.json"
+    embedded_key = "teams"
+
+
+class TagsStream(CallDimensionStream):
+    """Tags added to calls."""
+    name = "tags"
+    schema_filepath = SCHEMAS_DIR / "tags.json"
+    embedded_key = "tags"
+
+
+class ContactsStream(CallDimensionStream):
+    """Contacts attached to calls."""
+    name = "contacts"
+    schema_filepath = SCHEMAS_DIR / "contacts.json"
+    embedded_key = "contact"
+
+
+class CallAssetsStream(aircallStream):
+    """Recordings and voicemails of calls, downloaded while the calls sync.
+
+    Their links expire ten minutes after being listed, so every file is
+    requested as soon as `CallsStream` reads its call, by `asset_workers`
+    threads, and stored by the `asset_storage` under `asset_dir`.
+    """
+    name = "call_assets"
+    parent_stream_type = CallsStream
+    primary_keys = ["call_id", "kind"]
+    state_partitioning_keys = []
+    schema_filepath = SCHEMAS_DIR / "call_assets.json"
+
+    _downloader: Optional[AssetDownloader] = None
+    _schema_written = False
+
+    def download(self, context: dict) -> None:
+        """Start downloading the assets of a call, write the ones done."""
+        if self._downloader is None:
+            storage = STORAGES[self.config.get("asset_storage", "local")](
+                self.config["asset_dir"]
+            )
+            self._downloader = AssetDownloader(
+                storage,
+                self.requests_session,
+                max_workers=self.config.get("asset_workers", 4),
+                timeout=self.timeout,
+            )
+        for kind, url in context["assets"].items():
+            if url:
+                self._downloader.submit(context["call_id"], kind, url)
+        self.write_downloaded()
+
+    def write_downloaded(self, wait: bool = False) -> None:
+        """Write the records of the downloads done, or of all of them."""
+        if self._downloader is None:
+            return
+        for result in self._downloader.results(wait):
+            if "error" in result:
+                self.logger.warning(
+                    f"Could not download the {result['kind']} of call "
+                    f"{result['call_id']}: {result['error']}"
+                )
+                continue
+            if not self._schema_written:
+                self._write_schema_message()
+                self._schema_written = True
+            self._write_record_message(result)
+
+    def close_downloader(self) -> None:
+        """Stop the downloads in progress."""
+        if self._downloader is not None:
+            self._downloader.close()
+            self._downloader = None
+
 
 class UserStream(aircallStream):
     """Define custom stream."""
@@ -43,7 +499,53 @@ class UserStream(aircallStream):
 
     primary_keys = ["id"]
     replication_key = "created_at"
-    schema = user_properties.to_dict()
-    records_jsonpath = "$.users[*]"  # Or override `parse_response`.
+    schema_filepath = SCHEMAS_DIR / "users.json"
+    # `/v1/users/:id` returns {"user": {...}}
+    records_jsonpath = "$.user"
     #  not to store any state bookmarks for the child stream
     state_partitioning_keys = []
+
+    _prefetcher: Optional[PartitionPrefetcher] = None
+
+    @property
+    def workers(self) -> int:
+        """Return the number of user details fetched concurrently."""
+        return max(self.config.get("user_workers", 4), 1)
+
+    def listing_hashes(self) -> Dict[str, str]:
+        """Return the `listing_hash` of each user whose details were written."""
+        with self._tap.state_lock:
+            return self.get_context_state(None).setdefault("listing_hashes", {})
+
+    def unchanged(self, context: dict) -> bool:
+        """Return True if the user is listed as when its details were written."""
+        return self.listing_hashes().get(str(context["user_id"])) == context.get(
+            "listing_hash"
+        )
+
+    def prefetch(self, context: dict) -> None:
+        """Start fetching the details of a user, sharing the tap's rate budget."""
+        if self._prefetcher is None:
+            self._prefetcher = PartitionPrefetcher(
+                self.fetch_records, max_workers=self.workers, buffer_size=10
+            )
+        self._prefetcher.submit([context])
+
+    def close_prefetcher(self) -> None:
+        """Stop fetching user details ahead."""
+        if self._prefetcher is not None:
+            self._prefetcher.close()
+            self._prefetcher = None
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Return the details of a user, prefetched by `UsersStream` if possible."""
+        if context and self._prefetcher is not None and context in self._prefetcher:
+            yield from self._prefetcher.records(context)
+        else:
+            yield from self.fetch_records(context)
+        self._clear_checkpoint(context)
+        if context and "listing_hash" in context:
+            with self._tap.state_lock:
+                self.listing_hashes()[str(context["user_id"])] = context[
+                    "listing_hash"
+                ]
@@ -1,21 +1,60 @@
 """aircall tap class."""
 
-from typing import List
+import contextlib
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 
+import requests
+import singer_sdk._singerlib as singer
+from requests.adapters import HTTPAdapter
 from singer_sdk import Tap, Stream
 from singer_sdk import typing as th  # JSON schema typing helpers
+from singer_sdk.exceptions import ConfigValidationError
+from singer_sdk.helpers._classproperty import classproperty
+from singer_sdk.helpers.capabilities import CapabilitiesEnum, PluginCapabilities
 # TODO: Import your custom stream types here:
 from tap_aircall.streams import (
+    CallAssetsStream,
     CallsStream,
+    ContactsStream,
+    NumbersStream,
+    TagsStream,
+    TeamsStream,
+    UserStream,
     UsersStream,
 )
 from tap_aircall._tap import _Tap
+from tap_aircall.batch import BatchFiles
+from tap_aircall.cache import ResponseCache
+from tap_aircall.output import OrderedStdout, RecordWriter
+from tap_aircall.ratelimit import RateLimiter
+from tap_aircall.webhooks import WebhookServer
 # TODO: Compile a list of custom stream types here
 #       OR rewrite discover_streams() below with your custom logic.
 STREAM_TYPES = [
     CallsStream,
     UsersStream,
 ]
+# Streams of the objects embedded in calls, for `normalize_calls`.
+NORMALIZED_STREAM_TYPES = [
+    NumbersStream,
+    TeamsStream,
+    TagsStream,
+    ContactsStream,
+]
+# Stream written from the webhook events of each Aircall resource.
+WEBHOOK_STREAMS = {
+    "call": "calls",
+    "user": "users",
+    "number": "numbers",
+    "team": "teams",
+    "tag": "tags",
+    "contact": "contacts",
+}
 
 
 class Tapaircall(_Tap):
@@ -27,14 +66,42 @@ class Tapaircall(_Tap):
         th.Property(
             "api_token",
             th.StringType,
-            required=True,
-            description="The token to authenticate against the API service"
+            description=(
+                "The token to authenticate against the API service, unless "
+                "accounts is set"
+            )
         ),
         th.Property(
             "api_id",
             th.StringType,
-            required=True,
-            description="The id to authenticate against the API service"
+            description=(
+                "The id to authenticate against the API service, unless "
+                "accounts is set"
+            )
+        ),
+        th.Property(
+            "accounts",
+            th.ArrayType(
+                th.ObjectType(
+                    th.Property("key", th.StringType, required=True),
+                    th.Property("api_id", th.StringType, required=True),
+                    th.Property("api_token", th.StringType, required=True),
+                    th.Property("start_date", th.DateTimeType),
+                    th.Property("requests_per_minute", th.IntegerType),
+                )
+            ),
+            secret=True,
+            description=(
+                "Sync several accounts instead of api_id/api_token, each with "
+                "its own rate budget and state, their records tagged with the "
+                "key of their account"
+            )
+        ),
+        th.Property(
+            "account_workers",
+            th.IntegerType,
+            default=4,
+            description="Maximum number of accounts synced concurrently"
         ),
         th.Property(
             "auth_token",
@@ -56,11 +123,585 @@ class Tapaircall(_Tap):
         th.Property(
             "api_url",
             th.StringType,
-            default="https://api.mysample.com",
+            default="https://api.aircall.io/",
             description="The url for the API service"
         ),
+        th.Property(
+            "normalize_calls",
+            th.BooleanType,
+            default=False,
+            description=(
+                "Replace the objects embedded in calls by their ids, and write "
+                "them once each to the numbers, teams, tags and contacts streams"
+            )
+        ),
+        th.Property(
+            "window_days",
+            th.NumberType,
+            description=(
+                "Split the calls sync into time windows of this many days, "
+                "fetched concurrently and bookmarked separately"
+            )
+        ),
+        th.Property(
+            "max_workers",
+            th.IntegerType,
+            default=4,
+            description="Maximum number of windows fetched concurrently"
+        ),
+        th.Property(
+            "lookback_days",
+            th.NumberType,
+            description=(
+                "Re-read the calls started this many days before the bookmark, "
+                "emitting the ones that changed since they were written"
+            )
+        ),
+        th.Property(
+            "asset_dir",
+            th.StringType,
+            description=(
+                "Download the recordings and voicemails of the calls synced to "
+                "this location, listed in the call_assets stream"
+            )
+        ),
+        th.Property(
+            "asset_storage",
+            th.StringType,
+            default="local",
+            description="Storage of the downloaded assets: local"
+        ),
+        th.Property(
+            "asset_workers",
+            th.IntegerType,
+            default=4,
+            description="Maximum number of assets downloaded concurrently"
+        ),
+        th.Property(
+            "user_details",
+            th.BooleanType,
+            default=False,
+            description=(
+                "Write the user stream, fetching the details of each new or "
+                "changed user with one request per user"
+            )
+        ),
+        th.Property(
+            "user_workers",
+            th.IntegerType,
+            default=4,
+            description="Maximum number of user details fetched concurrently"
+        ),
+        th.Property(
+            "concurrent_streams",
+            th.BooleanType,
+            default=False,
+            description="Sync independent streams in parallel threads"
+        ),
+        th.Property(
+            "page_size",
+            th.IntegerType,
+            default=50,
+            description="Number of records requested per page, 50 at most"
+        ),
+        th.Property(
+            "pool_size",
+            th.IntegerType,
+            default=10,
+            description="Maximum number of kept-alive connections to the API"
+        ),
+        th.Property(
+            "connect_timeout",
+            th.NumberType,
+            default=10,
+            description="Seconds to wait for a connection to the API"
+        ),
+        th.Property(
+            "read_timeout",
+            th.NumberType,
+            default=300,
+            description="Seconds to wait for a response from the API"
+        ),
+        th.Property(
+            "prefetch_pages",
+            th.IntegerType,
+            default=2,
+            description="Pages fetched ahead of processing, 0 to disable"
+        ),
+        th.Property(
+            "prefetch_max_bytes",
+            th.IntegerType,
+            default=64 * 1024 * 1024,
+            description="Maximum size of the response bodies fetched ahead"
+        ),
+        th.Property(
+            "stream_json",
+            th.BooleanType,
+            default=False,
+            description=(
+                "Decode pages record by record instead of all at once, unless "
+                "cache_dir is set"
+            )
+        ),
+        th.Property(
+            "output_backend",
+            th.StringType,
+            default="sdk",
+            description=(
+                "Writer of the RECORD messages: sdk, json (same output, batched "
+                "writes) or orjson (compact output, needs orjson)"
+            )
+        ),
+        th.Property(
+            "output_batch_bytes",
+            th.IntegerType,
+            default=1024 * 1024,
+            description="Size of the batches of RECORD messages written to stdout"
+        ),
+        th.Property(
+            "batch_config",
+            th.ObjectType(
+                th.Property(
+                    "encoding",
+                    th.ObjectType(
+                        th.Property("format", th.StringType),
+                        th.Property("compression", th.StringType),
+                    ),
+                ),
+                th.Property(
+                    "storage",
+                    th.ObjectType(
+                        th.Property("root", th.StringType),
+                        th.Property("prefix", th.StringType),
+                    ),
+                ),
+            ),
+            description=(
+                "SDK batch config: write the calls and users to JSONL files, "
+                "announced by BATCH messages, instead of RECORD messages"
+            )
+        ),
+        th.Property(
+            "batch_dir",
+            th.StringType,
+            description=(
+                "Shorthand for a batch_config writing gzip JSONL files to this "
+                "local directory"
+            )
+        ),
+        th.Property(
+            "batch_records",
+            th.IntegerType,
+            default=100000,
+            description="Records per batch file"
+        ),
+        th.Property(
+            "cache_dir",
+            th.StringType,
+            description="Keep the API responses in this directory, see cache_mode"
+        ),
+        th.Property(
+            "cache_mode",
+            th.StringType,
+            default="readwrite",
+            description=(
+                "readwrite (serve fresh cached responses, cache the others), "
+                "record (always request, cache the responses) or replay (only "
+                "serve cached responses, never request)"
+            )
+        ),
+        th.Property(
+            "cache_ttl_seconds",
+            th.IntegerType,
+            default=86400,
+            description="Age after which a cached response is requested again"
+        ),
+        th.Property(
+            "cache_max_mb",
+            th.IntegerType,
+            default=1024,
+            description="Size of the cache above which the oldest files are deleted"
+        ),
+        th.Property(
+            "validate_every",
+            th.IntegerType,
+            default=0,
+            description=(
+                "Validate one in this many records against the stream schema, "
+                "logging the mismatches, 0 to never"
+            )
+        ),
+        th.Property(
+            "checkpoint_records",
+            th.IntegerType,
+            default=5000,
+            description="Emit a resumable checkpoint STATE every this many records"
+        ),
+        th.Property(
+            "checkpoint_seconds",
+            th.IntegerType,
+            default=60,
+            description="Emit a resumable checkpoint STATE every this many seconds"
+        ),
+        th.Property(
+            "webhook_tokens",
+            th.ArrayType(th.StringType),
+            secret=True,
+            description="Tokens of the webhooks whose events are accepted"
+        ),
+        th.Property(
+            "webhook_host",
+            th.StringType,
+            default="127.0.0.1",
+            description="Address the webhook receiver listens on"
+        ),
+        th.Property(
+            "webhook_port",
+            th.IntegerType,
+            default=8080,
+            description="Port the webhook receiver listens on"
+        ),
+        th.Property(
+            "webhook_flush_seconds",
+            th.NumberType,
+            default=1,
+            description=(
+                "Write the records of the webhook events received every this "
+                "many seconds, followed by a STATE message"
+            )
+        ),
+        th.Property(
+            "requests_per_minute",
+            th.IntegerType,
+            default=60,
+            description=(
+                "Request budget shared by all streams of a run, or of an "
+                "account with accounts"
+            )
+        ),
     ).to_dict()
 
+    # Key of the account synced by this tap, within a run of several `accounts`.
+    account: Optional[str] = None
+    # State of that run, holding the state of every account, written in STATE
+    # messages instead of the state of this tap.
+    run_state: Optional[dict] = None
+
+    # Resources shared by every stream of a run, created on first use.
+    _shared_lock = threading.Lock()
+    _rate_limiter: Optional[RateLimiter] = None
+    _requests_session: Optional[requests.Session] = None
+    _response_cache: Optional[ResponseCache] = None
+
+    # Guards the shared tap state when streams are synced concurrently.
+    state_lock = threading.RLock()
+
+    # Writes the RECORD messages during `sync_all`, unless `output_backend`
+    # is "sdk".
+    record_writer: Optional[RecordWriter] = None
+
+    def __init__(self, *args: Any, account: Optional[str] = None, **kwargs: Any):
+        """Initialize the tap, syncing `account` of a multi-account run if set."""
+        self.account = account
+        # batch files of the run not announced yet, see `aircallStream.batched`
+        self.batch_files = BatchFiles()
+        super().__init__(*args, **kwargs)
+
+    def _validate_config(
+            self, raise_errors: bool = True, warnings_as_errors: bool = False
+    ) -> Tuple[List[str], List[str]]:
+        """Also require credentials, from api_id/api_token or from accounts."""
+        warnings, errors = super()._validate_config(raise_errors, warnings_as_errors)
+        accounts = self.config.get("accounts")
+        if accounts:
+            keys = [account["key"] for account in accounts]
+            if len(set(keys)) < len(keys):
+                errors.append("The keys of accounts must be unique.")
+        elif not (self.config.get("api_id") and self.config.get("api_token")):
+            errors.append("Either api_id and api_token, or accounts are required.")
+        if errors and raise_errors:
+            raise ConfigValidationError(
+                f"Config validation failed: {'; '.join(errors)}"
+            )
+        return warnings, errors
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Load the bookmarks, the accounts of a multi-account run, webhook events."""
+        super().load_state(state)
+        if state.get("accounts"):
+            self.state["accounts"] = dict(state["accounts"])
+        if state.get("webhooks"):
+            self.state["webhooks"] = dict(state["webhooks"])
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """Return the rate limiter shared by all streams and partitions."""
+        with self._shared_lock:
+            if self._rate_limiter is None:
+                self._rate_limiter = RateLimiter(
+                    self.config.get("requests_per_minute", 60)
+                )
+            return self._rate_limiter
+
+    @property
+    def requests_session(self) -> requests.Session:
+        """Return the HTTP session shared by all streams and partitions.
+
+        Connections are kept alive and pooled, so consecutive pages reuse the
+        same TCP/TLS connection to the API.
+        """
+        with self._shared_lock:
+            if self._requests_session is None:
+                pool_size = self.config.get("pool_size", 10)
+                adapter = HTTPAdapter(
+                    pool_connections=pool_size, pool_maxsize=pool_size
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Accept-Encoding"] = "gzip, deflate"
+                session.headers["Connection"] = "keep-alive"
+                self._requests_session = session
+            return self._requests_session
+
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        """Return the response cache shared by all streams, if `cache_dir` is set."""
+        if not self.config.get("cache_dir"):
+            return None
+        with self._shared_lock:
+            if self._response_cache is None:
+                self._response_cache = ResponseCache(
+                    Path(self.config["cache_dir"]),
+                    self.config.get("cache_max_mb", 1024) * 1024 * 1024,
+                )
+            return self._response_cache
+
+    @classproperty
+    def capabilities(self) -> List[CapabilitiesEnum]:
+        """Return the SDK capabilities, and BATCH messages."""
+        return [*Tap.capabilities, PluginCapabilities.BATCH]
+
     def discover_streams(self) -> List[Stream]:
         """Return a list of discovered streams."""
-        return [stream_class(tap=self) for stream_class in STREAM_TYPES]
+        stream_types = list(STREAM_TYPES)
+        if self.config.get("normalize_calls"):
+            stream_types += NORMALIZED_STREAM_TYPES
+        if self.config.get("user_details"):
+            stream_types.append(UserStream)
+        if self.config.get("asset_dir"):
+            stream_types.append(CallAssetsStream)
+        return [stream_class(tap=self) for stream_class in stream_types]
+
+    def sync_all(self) -> None:  # type: ignore[misc]
+        """Sync all streams, writing records with the configured output backend.
+
+        With `batch_config` or `batch_dir`, the records of calls and users are
+        written to JSONL files announced by BATCH messages instead.
+
+        The SDK marks `Tap.sync_all` final, but has no hook around a run: this
+        override sets up the record writer, syncs the `accounts` or the
+        `concurrent_streams` in parallel, and writes the last STATE once every
+        stream is finalized. Its serial path is still `Tap.sync_all`.
+        """
+        backend = self.config.get("output_backend", "sdk")
+        if backend != "sdk":
+            self.record_writer = RecordWriter(
+                backend, self.config.get("output_batch_bytes", 1024 * 1024)
+            )
+        try:
+            if self.config.get("accounts") and self.account is None:
+                self._sync_accounts()
+            else:
+                self._sync_all()
+            # The progress markers of the last stream are finalized after its
+            # last STATE message, and so are the STATE messages deferred while
+            # batch files were pending.
+            self.write_state_message()
+        finally:
+            if self.record_writer is not None:
+                self.record_writer.flush()
+                self.record_writer = None
+
+    def write_state_message(self) -> None:
+        """Write the state of the run, after the records it covers."""
+        with self.state_lock:
+            if self.record_writer is not None:
+                self.record_writer.flush()
+            # with accounts, the state of every account of the run
+            state = self.state if self.run_state is None else self.run_state
+            singer.write_message(singer.StateMessage(value=state))
+
+    def listen_webhooks(self, stop: Optional[threading.Event] = None) -> None:
+        """Write the records of the webhook events received, until interrupted.
+
+        The objects of the events go through the schema and post-processing of
+        their stream, as synced ones do. Records are written in micro-batches,
+        every `webhook_flush_seconds`, each followed by a STATE message. The
+        events acknowledged but still queued are kept in that state, under
+        "webhooks", and written first by the next run.
+        """
+        if self.config.get("accounts"):
+            raise ConfigValidationError(
+                "Webhook events are received for one account, set api_id and "
+                "api_token instead of accounts."
+            )
+        server = WebhookServer(
+            self.config.get("webhook_tokens") or [],
+            self.config.get("webhook_host", "127.0.0.1"),
+            self.config.get("webhook_port", 8080),
+        )
+        streams = {
+            resource: self.streams[name]
+            for resource, name in WEBHOOK_STREAMS.items()
+            if name in self.streams and self.streams[name].selected
+        }
+        for stream in streams.values():
+            # the dimension streams write theirs with their first record
+            if not stream.parent_stream_type:
+                stream._write_schema_message()
+
+        backend = self.config.get("output_backend", "sdk")
+        self.record_writer = RecordWriter(
+            "json" if backend == "sdk" else backend,
+            self.config.get("output_batch_bytes", 1024 * 1024),
+        )
+        try:
+            with server:
+                self.logger.info(f"Receiving webhook events on {server.url}")
+                pending = self.state.get("webhooks", {}).get("pending") or []
+                if pending:
+                    self.logger.info(f"Writing {len(pending)} pending events.")
+                    self._write_webhook_events(pending, streams, server)
+                while stop is None or not stop.is_set():
+                    self._write_webhook_events(
+                        server.batch(self.config.get("webhook_flush_seconds", 1)),
+                        streams,
+                        server,
+                    )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # the events already acknowledged are written before exiting
+            self._write_webhook_events(server.drain(), streams, server)
+            self.record_writer.flush()
+            self.record_writer = None
+            self.logger.info(
+                f"Received {server.received} webhook events, "
+                f"refused {server.rejected}."
+            )
+
+    def _write_webhook_events(
+            self,
+            events: List[dict],
+            streams: Dict[str, Stream],
+            server: WebhookServer,
+    ) -> None:
+        for event in events:
+            stream = streams.get(event.get("resource"))
+            if stream is None or not isinstance(event.get("data"), dict):
+                self.logger.debug(f"Ignoring webhook event {event.get('event')}.")
+                continue
+            stream.write_webhook_record(event["data"])
+        if events:
+            with self.state_lock:
+                # their token is not needed to write them
+                self.state["webhooks"] = {"pending": [
+                    {key: value for key, value in event.items() if key != "token"}
+                    for event in server.pending()
+                ]}
+            self.write_state_message()
+
+    def account_tap(self, account: dict) -> "Tapaircall":
+        """Return the tap syncing one of the `accounts`, in this tap's run.
+
+        It has its own config, rate limiter and state, the latter kept under
+        the account key in the `accounts` of this tap's state. The HTTP
+        session, response cache, writers and metrics are this tap's.
+        """
+        key = account["key"]
+        config = {
+            name: value
+            for name, value in self.config.items()
+            if name not in ("accounts", "account_workers")
+        }
+        config.update(
+            (name, value) for name, value in account.items() if name != "key"
+        )
+        if config.get("asset_dir"):
+            # call ids are only unique within an account
+            config["asset_dir"] = os.path.join(config["asset_dir"], key)
+        with self.state_lock:
+            accounts_state = self.state.setdefault("accounts", {})
+            tap = type(self)(
+                config=config,
+                catalog=self._input_catalog,
+                state=accounts_state.get(key) or {},
+                parse_env_config=False,
+                account=key,
+            )
+            accounts_state[key] = tap.state
+        tap.run_state = self.state
+        tap._requests_session = self.requests_session
+        tap._response_cache = self.response_cache
+        tap.record_writer = self.record_writer
+        tap.batch_files = self.batch_files
+        tap.metrics = self.metrics
+        return tap
+
+    def _sync_accounts(self) -> None:
+        """Sync the `accounts` in parallel threads, `account_workers` at a time."""
+        taps = [self.account_tap(account) for account in self.config["accounts"]]
+        workers = min(len(taps), self.config.get("account_workers", 4))
+        with self._ordered_stdout():
+            with ThreadPoolExecutor(
+                max_workers=max(workers, 1),
+                thread_name_prefix="aircall-account",
+            ) as executor:
+                futures = [executor.submit(tap._sync_all) for tap in taps]
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def _ordered_stdout() -> contextlib.AbstractContextManager:
+        """Return a context serializing the messages of concurrent threads."""
+        if isinstance(sys.stdout, OrderedStdout):
+            # already, e.g. streams synced concurrently within an account
+            return contextlib.nullcontext()
+        return OrderedStdout()
+
+    def _sync_all(self) -> None:
+        """Sync all streams, in parallel threads if `concurrent_streams` is set."""
+        if not self.config.get("concurrent_streams"):
+            super().sync_all()
+            return
+
+        self._reset_state_progress_markers()
+        self._set_compatible_replication_methods()
+        streams = []
+        for stream in self.streams.values():
+            if not stream.selected and not stream.has_selected_descendents:
+                self.logger.info(f"Skipping deselected stream '{stream.name}'.")
+                continue
+            if stream.parent_stream_type:
+                # synced by their parent stream
+                continue
+            streams.append(stream)
+
+        with self._ordered_stdout():
+            with ThreadPoolExecutor(
+                max_workers=max(len(streams), 1), thread_name_prefix="aircall-stream"
+            ) as executor:
+                futures = [
+                    executor.submit(self._sync_stream, stream) for stream in streams
+                ]
+            for future in futures:
+                future.result()
+
+        for stream in self.streams.values():
+            stream.log_sync_costs()
+
+    @staticmethod
+    def _sync_stream(stream: Stream) -> None:
+        stream.sync()
+        stream.finalize_state_progress_markers()
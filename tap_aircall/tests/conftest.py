@@ -0,0 +1,51 @@
+"""Fixtures shared by the tests running the tap against the mock API."""
+
+import contextlib
+import io
+import json
+from typing import Callable
+
+import pytest
+
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+@pytest.fixture
+def make_tap() -> Callable[..., Tapaircall]:
+    """Return a function creating a tap reading from a `MockAircallAPI`."""
+
+    def make(
+        api: MockAircallAPI, state: dict = None, catalog: dict = None, **config
+    ) -> Tapaircall:
+        return Tapaircall(
+            config={
+                "api_id": "id",
+                "api_token": "token",
+                "start_date": "2020-01-01T00:00:00Z",
+                "api_url": api.url,
+                "requests_per_minute": 60000,
+                **config,
+            },
+            state=state,
+            catalog=catalog,
+            parse_env_config=False,
+        )
+
+    return make
+
+
+@pytest.fixture
+def sync(make_tap: Callable[..., Tapaircall]) -> Callable[..., list]:
+    """Return a function syncing a tap, returning the messages it wrote."""
+
+    def run(
+        api: MockAircallAPI, state: dict = None, catalog: dict = None, **config
+    ) -> list:
+        tap = make_tap(api, state=state, catalog=catalog, **config)
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            tap.sync_all()
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    return run
@@ -0,0 +1,213 @@
+"""Synthetic Aircall API payloads shared by the tests and benchmarks."""
+
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+BASE_URL = "https://api.aircall.io/v1"
+EPOCH = 1609459200  # 2021-01-01T00:00:00Z
+
+
+def make_user(user_id: int) -> Dict[str, Any]:
+    """Return a user object shaped like the ones embedded in calls."""
+    return {
+        "id": user_id,
+        "direct_link": f"{BASE_URL}/users/{user_id}",
+        "name": f"Agent {user_id}",
+        "email": f"agent{user_id}@example.com",
+        "created_at": "2020-06-01T09:00:00.000Z",
+        "available": True,
+        "availability_status": "available",
+        "numbers": [],
+        "time_zone": "Europe/Paris",
+        "language": "en-US",
+        "wrap_up_time": 0,
+    }
+
+
+def make_number(number_id: int, users: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return a number object with its users."""
+    return {
+        "id": number_id,
+        "direct_link": f"{BASE_URL}/numbers/{number_id}",
+        "name": f"Line {number_id}",
+        "digits": f"+33 1 00 00 {number_id:04d}",
+        "created_at": "2020-06-01T09:00:00.000Z",
+        "country": "FR",
+        "time_zone": "Europe/Paris",
+        "open": True,
+        "availability_status": "open",
+        "is_ivr": False,
+        "live_recording_activated": True,
+        "users": users,
+        "priority": None,
+        "messages": {
+            "welcome": f"{BASE_URL}/numbers/{number_id}/welcome.mp3",
+            "waiting": f"{BASE_URL}/numbers/{number_id}/waiting.mp3",
+        },
+    }
+
+
+def make_call(call_id: int, rng: Optional[random.Random] = None) -> Dict[str, Any]:
+    """Return a fully nested call object."""
+    rng = rng or random.Random(call_id)
+    started_at = EPOCH + call_id * 60
+    user = make_user(rng.randint(1, 50))
+    number = make_number(rng.randint(1, 10), [make_user(i) for i in range(1, 4)])
+    return {
+        "id": call_id,
+        "direct_link": f"{BASE_URL}/calls/{call_id}",
+        "started_at": started_at,
+        "answered_at": started_at + 5,
+        "ended_at": started_at + 125,
+        "duration": 125,
+        "status": "done",
+        "direction": rng.choice(["inbound", "outbound"]),
+        "raw_digits": "+33 6 12 34 56 78",
+        "asset": f"https://assets.aircall.io/calls/{call_id}/recording",
+        "recording": f"https://recordings.aircall.io/{call_id}.mp3",
+        "voicemail": None,
+        "archived": False,
+        "missed_call_reason": None,
+        "cost": "1.2",
+        "number": number,
+        "user": user,
+        "contact": {
+            "id": call_id % 1000,
+            "direct_link": f"{BASE_URL}/contacts/{call_id % 1000}",
+            "first_name": "Jane",
+            "last_name": "Doe",
+            "company_name": "ACME",
+            "description": None,
+            "information": None,
+            "is_shared": True,
+            "phone_numbers": [{"id": 1, "label": "work", "value": "+33612345678"}],
+            "emails": [{"id": 1, "label": "work", "value": "jane@example.com"}],
+        },
+        "assigned_to": user,
+        "teams": [
+            {
+                "id": 1,
+                "direct_link": f"{BASE_URL}/teams/1",
+                "name": "Support",
+                "created_at": "2020-06-01T09:00:00.000Z",
+                "users": [make_user(i) for i in range(1, 6)],
+            }
+        ],
+        "transferred_by": None,
+        "transferred_to": None,
+        "comments": [
+            {
+                "id": call_id,
+                "content": "Customer asked for a callback.",
+                "posted_at": started_at + 200,
+                "posted_by": user,
+            }
+        ],
+        "tags": [
+            {
+                "id": 7,
+                "direct_link": f"{BASE_URL}/tags/7",
+                "name": "VIP",
+                "color": "#ff0000",
+                "description": None,
+            }
+        ],
+        "participants": [],
+    }
+
+
+def calls_page(page: int, per_page: int, total: int) -> Dict[str, Any]:
+    """Return one `/v1/calls` page as the API would serve it."""
+    first = (page - 1) * per_page
+    last = min(first + per_page, total)
+    next_page_link = None
+    if last < total:
+        next_page_link = f"{BASE_URL}/calls?page={page + 1}&per_page={per_page}"
+    return {
+        "calls": [make_call(i + 1) for i in range(first, last)],
+        "meta": {
+            "count": last - first,
+            "total": total,
+            "current_page": page,
+            "per_page": per_page,
+            "next_page_link": next_page_link,
+            "previous_page_link": None,
+        },
+    }
+
+
+def calls_page_bytes(page: int = 1, per_page: int = 50, total: int = 10000) -> bytes:
+    """Return one serialized `/v1/calls` page."""
+    return json.dumps(calls_page(page, per_page, total)).encode("utf-8")
+
+
+# Date-time properties the API sends as unix timestamps, not ISO strings.
+UNIX_DATETIME_KEYS = frozenset({"started_at", "answered_at", "ended_at", "posted_at"})
+_WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel")
+
+
+def fake_value(
+    prop: Dict[str, Any], rng: random.Random, key: str = "", depth: int = 0
+) -> Any:
+    """Return a random value matching a JSON schema property.
+
+    Arrays get up to two items, and none past `depth` 3, so that the deeply
+    nested call schema yields payloads of a realistic size.
+    """
+    types = prop.get("type", [])
+    types = [types] if isinstance(types, str) else [t for t in types if t != "null"]
+    if "object" in types or "properties" in prop:
+        return {
+            name: fake_value(sub_prop, rng, name, depth + 1)
+            for name, sub_prop in prop.get("properties", {}).items()
+        }
+    if "array" in types:
+        size = rng.randint(1, 2) if depth < 3 else 0
+        items = prop.get("items", {})
+        return [fake_value(items, rng, key, depth + 1) for _ in range(size)]
+    if prop.get("format") == "date-time":
+        timestamp = EPOCH - rng.randint(0, 365 * 86400)
+        if key in UNIX_DATETIME_KEYS:
+            return timestamp
+        return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(timestamp))
+    if "integer" in types:
+        return rng.randint(1, 100000)
+    if "number" in types:
+        return round(rng.uniform(0, 100), 2)
+    if "boolean" in types:
+        return rng.random() < 0.5
+    if prop.get("format") == "email" or key == "email":
+        return f"{rng.choice(_WORDS)}{rng.randint(1, 999)}@example.com"
+    if key in ("direct_link", "recording", "voicemail", "asset"):
+        return f"{BASE_URL}/{rng.choice(_WORDS)}/{rng.randint(1, 100000)}"
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 4)))
+
+
+class RecordFactory:
+    """Build records of a schema from a few random templates.
+
+    `record(record_id)` is cheap: it copies one of `variants` templates and
+    overrides its `id` (and, for calls, the unix date-times, one minute apart
+    from `EPOCH`), so large volumes can be served without generating every
+    nested object.
+    """
+
+    def __init__(
+        self, schema: Dict[str, Any], variants: int = 50, seed: int = 0
+    ) -> None:
+        """Generate the templates of `schema`."""
+        rng = random.Random(seed)
+        self._templates = [fake_value(schema, rng) for _ in range(variants)]
+
+    def record(self, record_id: int) -> Dict[str, Any]:
+        """Return the record with the given id."""
+        record = dict(self._templates[record_id % len(self._templates)])
+        record["id"] = record_id
+        if "started_at" in record:
+            started_at = EPOCH + record_id * 60
+            record["started_at"] = started_at
+            record["answered_at"] = started_at + 5
+            record["ended_at"] = started_at + 125
+        return record
@@ -0,0 +1,304 @@
+"""Local stand-in for the Aircall API, served from a background thread.
+
+Records are generated from the stream schemas in `tap_aircall.schemas`, or
+replayed from JSON files captured beforehand. The server can also be run on
+its own, e.g. for the end-to-end benchmarks::
+
+    python -m tap_aircall.tests.mock_api --calls 100000 --latency 0.05
+"""
+
+import argparse
+import json
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from tap_aircall.schemas import call_properties, user_properties
+from tap_aircall.tests.fixtures import EPOCH, RecordFactory
+
+
+class MockAircallAPI:
+    """Serve paginated `/v1/calls` and `/v1/users` with rate-limit headers.
+
+    Use as a context manager; `url` is then the base URL to point the tap at.
+    Every `throttle_every`-th request is answered with a 429 whose
+    `X-AircallApi-Reset` lies `throttle_seconds` in the future, and every
+    response is delayed by `latency` seconds. Calls start one
+    minute apart from `EPOCH` and are filtered with `from`/`to`; pages deeper
+    than `max_depth` records are refused like the real API does.
+
+    `replay` maps a resource ("calls", "users") to a list of records to serve
+    in place of the generated ones. `updates` maps a call id to fields
+    overriding those of the generated call, e.g. to edit it between two syncs.
+    With `asset_bytes`, the `recording` of every call links to an mp3 file of
+    that size served under `/assets/`, and calls have no `voicemail`.
+    Every `cut_every`-th response is cut halfway through its body, and its
+    connection closed, like a connection reset mid-transfer.
+
+    Connections are kept alive (HTTP/1.1) and counted in `connections`; pass
+    `tls=(certfile, keyfile)` to serve HTTPS. `GET /__stats` returns the
+    request and connection counts.
+    """
+
+    def __init__(
+        self,
+        total_calls: int = 100,
+        total_users: int = 10,
+        default_per_page: int = 20,
+        throttle_every: int = 0,
+        throttle_seconds: float = 1.0,
+        requests_per_minute: int = 60,
+        max_depth: int = 10000,
+        max_per_page: int = 50,
+        latency: float = 0.0,
+        tls: Optional[Tuple[str, str]] = None,
+        replay: Optional[Dict[str, Sequence[dict]]] = None,
+        updates: Optional[Dict[int, dict]] = None,
+        asset_bytes: int = 0,
+        cut_every: int = 0,
+        port: int = 0,
+    ) -> None:
+        """Configure the volume served and the 429 injection."""
+        self.total_calls = total_calls
+        self.total_users = total_users
+        self.default_per_page = default_per_page
+        self.throttle_every = throttle_every
+        self.throttle_seconds = throttle_seconds
+        self.requests_per_minute = requests_per_minute
+        self.max_depth = max_depth
+        self.max_per_page = max_per_page
+        self.latency = latency
+        self.tls = tls
+        self.replay = replay or {}
+        self.updates = updates if updates is not None else {}
+        self.asset_bytes = asset_bytes
+        self.cut_every = cut_every
+        self.port = port
+        self.connections = 0
+        self.requests: List[Dict[str, Any]] = []
+        self._factories = {
+            "calls": RecordFactory(call_properties.to_dict()).record,
+            "users": RecordFactory(user_properties.to_dict()).record,
+        }
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        """Return the base URL of the running server."""
+        assert self._server is not None, "The mock API is not running."
+        host, port = self._server.server_address[:2]
+        scheme = "https" if self.tls else "http"
+        return f"{scheme}://{host}:{port}/"
+
+    def __enter__(self) -> "MockAircallAPI":
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # one write per response, so keep-alive is not slowed by Nagle
+            wbufsize = -1
+            disable_nagle_algorithm = True
+
+            def setup(self) -> None:
+                with api._lock:
+                    api.connections += 1
+                super().setup()
+
+            def do_GET(self) -> None:  # noqa: N802
+                api._handle(self)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        if self.tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*self.tls)
+            self._server.socket = context.wrap_socket(
+                self._server.socket, server_side=True
+            )
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        assert self._server is not None
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _records(
+        self, resource: str, query: Dict[str, List[str]]
+    ) -> Tuple[Sequence[int], Callable[[int], dict]]:
+        """Return the ids matching the query and how to build their records."""
+        if resource in self.replay:
+            replayed = self.replay[resource]
+            return range(len(replayed)), replayed.__getitem__
+        if resource != "calls":
+            return range(1, self.total_users + 1), self._factories[resource]
+
+        ids = range(1, self.total_calls + 1)
+        if "from" in query:
+            first_id = -(-(float(query["from"][0]) - EPOCH) // 60)
+            ids = range(max(int(first_id), 1), ids.stop)
+        if "to" in query:
+            last_id = -(-(float(query["to"][0]) - EPOCH) // 60)
+            ids = range(ids.start, min(int(last_id), ids.stop))
+        return ids, self._call
+
+    def _call(self, call_id: int) -> dict:
+        call = self._factories["calls"](call_id)
+        if self.asset_bytes:
+            call["recording"] = f"{self.url}assets/{call_id}/recording.mp3"
+            call["voicemail"] = None
+        return {**call, **self.updates.get(call_id, {})}
+
+    def _asset(self, path: str) -> bytes:
+        pattern = path.encode("utf-8")
+        return (pattern * (self.asset_bytes // len(pattern) + 1))[: self.asset_bytes]
+
+    def _page(self, resource: str, query: Dict[str, List[str]]) -> Dict[str, Any]:
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", [str(self.default_per_page)])[0])
+        per_page = min(per_page, self.max_per_page)
+        ids, make = self._records(resource, query)
+        total = len(ids)
+        first = (page - 1) * per_page
+        last = min(first + per_page, total)
+        next_page_link = None
+        if last < total:
+            next_page_link = (
+                f"{self.url}v1/{resource}?page={page + 1}&per_page={per_page}"
+            )
+        return {
+            resource: [make(record_id) for record_id in ids[first:last]],
+            "meta": {
+                "count": last - first,
+                "total": total,
+                "current_page": page,
+                "per_page": per_page,
+                "next_page_link": next_page_link,
+                "previous_page_link": None,
+            },
+        }
+
+    def _route(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, Any]:
+        parts = path.strip("/").split("/")
+        if parts == ["__stats"]:
+            return 200, {
+                "requests": len(self.requests),
+                "connections": self.connections,
+            }
+        if parts[:1] == ["assets"] and self.asset_bytes:
+            return 200, self._asset(path)
+        if parts[:1] != ["v1"] or len(parts) not in (2, 3):
+            return 404, {"error": "Not found"}
+        resource = parts[1]
+        if resource not in ("calls", "users"):
+            return 404, {"error": "Not found"}
+        if len(parts) == 3:
+            # e.g. /v1/users/:id
+            ids, make = self._records(resource, {})
+            record_id = int(parts[2])
+            if record_id not in ids:
+                return 404, {"error": "Not found"}
+            return 200, {resource[:-1]: make(record_id)}
+        page = int(query.get("page", ["1"])[0])
+        per_page = int(query.get("per_page", [str(self.default_per_page)])[0])
+        if page * per_page > self.max_depth:
+            return 400, {"error": "Pagination limit reached"}
+        return 200, self._page(resource, query)
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        with self._lock:
+            self.requests.append({
+                "path": url.path,
+                "query": query,
+                "authorization": handler.headers.get("Authorization"),
+            })
+            count = len(self.requests)
+
+        headers = {
+            "X-AircallApi-Limit": str(self.requests_per_minute),
+            "X-AircallApi-Remaining": str(self.requests_per_minute - 1),
+            "X-AircallApi-Reset": str(int(time.time()) + 60),
+        }
+        if self.latency:
+            time.sleep(self.latency)
+        if self.throttle_every and count % self.throttle_every == 0:
+            status, body = 429, {"error": "Too many requests"}
+            headers["X-AircallApi-Remaining"] = "0"
+            headers["X-AircallApi-Reset"] = str(time.time() + self.throttle_seconds)
+        else:
+            status, body = self._route(url.path, query)
+
+        if isinstance(body, bytes):
+            payload, content_type = body, "audio/mpeg"
+        else:
+            payload, content_type = json.dumps(body).encode("utf-8"), "application/json"
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        if self.cut_every and count % self.cut_every == 0:
+            handler.wfile.write(payload[:len(payload) // 2])
+            handler.close_connection = True
+            return
+        handler.wfile.write(payload)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Run the mock API until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--calls", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--max-per-page", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--requests-per-minute", type=int, default=60)
+    parser.add_argument("--throttle-every", type=int, default=0)
+    parser.add_argument("--throttle-seconds", type=float, default=1.0)
+    parser.add_argument(
+        "--replay",
+        type=Path,
+        help="Directory of calls.json / users.json record lists to serve.",
+    )
+    args = parser.parse_args(argv)
+
+    replay = {}
+    if args.replay:
+        for resource in ("calls", "users"):
+            path = args.replay / f"{resource}.json"
+            if path.exists():
+                replay[resource] = json.loads(path.read_text())
+
+    api = MockAircallAPI(
+        total_calls=args.calls,
+        total_users=args.users,
+        max_per_page=args.max_per_page,
+        latency=args.latency,
+        requests_per_minute=args.requests_per_minute,
+        throttle_every=args.throttle_every,
+        throttle_seconds=args.throttle_seconds,
+        replay=replay,
+        port=args.port,
+    )
+    with api:
+        print(api.url, flush=True)
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Tests for the download of call recordings."""
+
+import hashlib
+from pathlib import Path
+
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def _assets(messages: list) -> list:
+    return [
+        message["record"]
+        for message in messages
+        if message["type"] == "RECORD" and message["stream"] == "call_assets"
+    ]
+
+
+def test_recordings_are_downloaded_once(tmp_path, sync):
+    """Every recording is stored and listed in call order, then not fetched again."""
+    with MockAircallAPI(
+        total_calls=30, requests_per_minute=60000, asset_bytes=100000
+    ) as api:
+        first = _assets(sync(api, asset_dir=str(tmp_path), asset_workers=3))
+        api.requests.clear()
+        again = _assets(sync(api, asset_dir=str(tmp_path), asset_workers=3))
+
+    assert [asset["call_id"] for asset in first] == list(range(1, 31))
+    for asset in first:
+        content = Path(asset["path"]).read_bytes()
+        assert asset["kind"] == "recording"
+        assert asset["size"] == len(content) == 100000
+        assert asset["sha256"] == hashlib.sha256(content).hexdigest()
+        assert asset["downloaded"] is True
+    assert [
+        {**asset, "downloaded": True} for asset in again
+    ] == first
+    assert not any(asset["downloaded"] for asset in again)
+    assert not any(
+        request["path"].startswith("/assets/") for request in api.requests
+    )
+    assert not list(tmp_path.rglob("*.part"))
@@ -0,0 +1,65 @@
+"""Tests for the BATCH message output."""
+
+import gzip
+import json
+from urllib.parse import urlparse
+
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def _call_ids(messages: list) -> list:
+    """Return the ids of the calls in the batch files announced by `messages`."""
+    ids = []
+    for message in messages:
+        if message["type"] == "BATCH" and message["stream"] == "calls":
+            assert message["encoding"] == {"format": "jsonl", "compression": "gzip"}
+            with gzip.open(urlparse(message["manifest"][0]).path) as lines:
+                ids += [json.loads(line)["id"] for line in lines]
+    return ids
+
+
+def test_state_follows_closed_files(tmp_path, sync):
+    """Records go to files of `batch_records`; a STATE never covers open files."""
+    config = {"batch_dir": str(tmp_path), "batch_records": 50}
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        messages = sync(api, **config)
+        assert not any(
+            message["type"] == "RECORD" and message["stream"] in ("calls", "users")
+            for message in messages
+        )
+        assert _call_ids(messages) == list(range(1, 231))
+
+        # pretend the run died right after the third STATE
+        states = [i for i, message in enumerate(messages) if message["type"] == "STATE"]
+        crash = states[2]
+        state = messages[crash]["value"]
+        resumed = sync(api, state=state, **config)
+
+    assert state["bookmarks"]["calls"]["checkpoint"]["records"] == 150
+    assert _call_ids(messages[:crash]) + _call_ids(resumed) == list(range(1, 231))
+
+
+def test_sdk_batch_config(tmp_path, sync):
+    """The SDK `batch_config` sets the storage root and prefix of the files."""
+    config = {
+        "batch_config": {
+            "encoding": {"format": "jsonl", "compression": "gzip"},
+            "storage": {"root": tmp_path.as_uri(), "prefix": "run-"},
+        },
+        "batch_records": 100,
+    }
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        messages = sync(api, **config)
+
+    manifests = [
+        message["manifest"][0]
+        for message in messages
+        if message["type"] == "BATCH" and message["stream"] == "calls"
+    ]
+    assert len(manifests) == 3
+    assert all(
+        urlparse(url).path.startswith(f"{tmp_path}/run-tap-aircall--calls-")
+        for url in manifests
+    )
+    assert _call_ids(messages) == list(range(1, 231))
+    assert "checkpoint" not in messages[-1]["value"]["bookmarks"]["calls"]
@@ -0,0 +1,76 @@
+"""Tests for the on-disk response cache."""
+
+import os
+import time
+
+import pytest
+from singer_sdk.exceptions import FatalAPIError
+
+from tap_aircall.cache import ResponseCache
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def _records(messages: list) -> list:
+    return [m["record"] for m in messages if m["type"] == "RECORD"]
+
+
+def test_rerun_is_served_from_cache(tmp_path, sync):
+    """A second run makes no request, a replay fails on unknown queries."""
+    with MockAircallAPI(total_calls=120, requests_per_minute=60000) as api:
+        first = sync(api, cache_dir=str(tmp_path))
+        requested = len(api.requests)
+        api.requests.clear()
+        again = sync(api, cache_dir=str(tmp_path), cache_mode="replay")
+        assert not api.requests
+
+        with pytest.raises(FatalAPIError):
+            sync(api, cache_dir=str(tmp_path / "empty"), cache_mode="replay")
+        assert not api.requests
+
+    assert _records(again) == _records(first)
+    assert len(list(tmp_path.glob("*.json.gz"))) == requested
+
+
+def test_key_ignores_parameter_order():
+    """The same query is one entry, whatever the order of its parameters."""
+    key = ResponseCache.key
+    url = "https://api.aircall.io/v1/calls?page=2&per_page=50&from=1"
+    assert key("a", url) == key(
+        "a", "https://api.aircall.io/v1/calls?from=1&per_page=50&page=2"
+    )
+    assert key("a", url) != key("b", url)
+    assert key("a", url) != key("a", url.replace("page=2", "page=3"))
+
+
+def test_entries_expire_and_are_evicted(tmp_path):
+    """Old entries are misses, the oldest are deleted above the size limit."""
+    cache = ResponseCache(tmp_path, max_bytes=3500)
+    for index in range(3):
+        cache.put(str(index), {"status": 200}, os.urandom(1000))
+        path = tmp_path / f"{index}.json.gz"
+        os.utime(path, (time.time() - 100 + index, time.time() - 100 + index))
+    cache.put("3", {"status": 200}, os.urandom(1000))
+
+    assert cache.get("0", None) is None
+    assert cache.get("1", 1000) is not None
+    assert cache.get("1", 10) is None
+    meta, body = cache.get("3", 10)
+    assert meta == {"status": 200} and len(body) == 1000
+
+
+def test_reopened_cache_evicts_the_oldest_entries(tmp_path):
+    """Entries found on open are evicted oldest first, partial files deleted."""
+    cache = ResponseCache(tmp_path)
+    for index in range(3):
+        cache.put(str(index), {"status": 200}, os.urandom(1000))
+        path = tmp_path / f"{index}.json.gz"
+        # the first entry written is the most recent one
+        os.utime(path, (time.time() - 100 - index, time.time() - 100 - index))
+    (tmp_path / "3.json.gz.1234.part").write_bytes(b"partial")
+
+    cache = ResponseCache(tmp_path, max_bytes=3500)
+    cache.put("3", {"status": 200}, os.urandom(1000))
+
+    assert not list(tmp_path.glob("*.part"))
+    assert cache.get("2", None) is None
+    assert cache.get("0", None) is not None
@@ -0,0 +1,85 @@
+"""Tests for the compiled record conformers and validators."""
+
+import copy
+import logging
+from datetime import datetime, timezone
+
+from singer_sdk.helpers._typing import conform_record_data_types
+
+from tap_aircall import conform as conform_module
+from tap_aircall.client import apply_datetime_plan, compile_datetime_plan
+from tap_aircall.conform import compile_conformer, compile_validator
+from tap_aircall.metrics import SyncMetrics
+from tap_aircall.schemas import call_properties
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.fixtures import RecordFactory, make_call
+
+LOGGER = logging.getLogger("tap-aircall")
+
+
+def test_conformer_matches_the_sdk():
+    """Generated calls, odd values included, are conformed as the SDK does."""
+    schema = call_properties.to_dict()
+    conform = compile_conformer("calls", schema, LOGGER)
+    factory = RecordFactory(schema)
+    records = [factory.record(call_id) for call_id in range(200)]
+    records[1]["archived"] = 0
+    records[2]["archived"] = None
+    records[3]["unknown"] = "dropped"
+    records[4]["started_at"] = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+    for record in records:
+        expected = conform_record_data_types("calls", record, schema, LOGGER)
+        assert conform(copy.deepcopy(record)) == expected
+    assert conform(records[1])["archived"] is False
+    assert "unknown" not in conform(records[3])
+
+
+def test_conformer_drops_the_context_keys(monkeypatch):
+    """Partition keys copied to records are dropped, without the SDK fallback."""
+    schema = call_properties.to_dict()
+    record = RecordFactory(schema).record(1)
+    expected = conform_record_data_types("calls", record, schema, LOGGER)
+    conform = compile_conformer("calls", schema, LOGGER, ("from", "to"))
+    fallbacks = []
+    monkeypatch.setattr(
+        conform_module, "conform_record_data_types", lambda *args: fallbacks.append(1)
+    )
+    assert conform({**record, "from": 0, "to": 3600}) == expected
+    assert not fallbacks
+
+
+def test_validator_reports_nested_mismatches():
+    """Type errors are reported with the path of the value, valid calls pass."""
+    schema = call_properties.to_dict()
+    validate = compile_validator(schema)
+    call = make_call(1)
+    apply_datetime_plan(call, compile_datetime_plan(schema))
+    assert validate(call) == []
+
+    call["duration"] = "long"
+    call["user"]["id"] = None
+    call["comments"] = [{"id": "one"}]
+    errors = validate(call)
+    assert "$.duration: str is not integer/null" in errors
+    assert "$.user.id: NoneType is not integer" in errors
+    assert "$.comments[0].id: str is not integer/null" in errors
+
+
+def test_validate_every_samples_records():
+    """One in `validate_every` written records is validated."""
+    tap = Tapaircall(
+        config={"api_id": "id", "api_token": "token", "validate_every": 3},
+        parse_env_config=False,
+    )
+    tap.metrics = SyncMetrics()
+    stream = tap.streams["calls"]
+    for call_id in range(9):
+        record = stream.post_process(make_call(call_id), None)
+        if call_id % 2:
+            record["duration"] = "long"
+        list(stream._generate_record_messages(record))
+    counters = tap.metrics.stream("calls").to_dict()["counters"]
+    # records 0, 3 and 6, the second one invalid
+    assert counters["validated_records"] == 3
+    assert counters["invalid_records"] == 1
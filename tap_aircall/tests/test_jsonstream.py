@@ -0,0 +1,78 @@
+"""Tests for the incremental page decoder."""
+
+import json
+
+import pytest
+
+from tap_aircall.jsonstream import iter_json_records
+from tap_aircall.tests.fixtures import calls_page
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 65536])
+def test_records_decoded_across_chunks(chunk_size):
+    """Records and the other top-level values survive any chunking."""
+    page = calls_page(1, 20, 100)
+    body = json.dumps(page, indent=1).encode("utf-8")
+    chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    values = {}
+
+    records = list(iter_json_records(chunks, "calls", values.__setitem__))
+
+    assert records == page["calls"]
+    assert values == {"meta": page["meta"]}
+
+
+def test_truncated_body_raises():
+    """A body cut short is an error, not a shorter page."""
+    with pytest.raises(ValueError):
+        list(iter_json_records([b'{"calls": [{"id": 1}, {"id"'], "calls"))
+
+
+def test_streamed_sync_matches_decoded_sync(make_tap):
+    """`stream_json` yields the same records, deep pagination included."""
+    synced = []
+    for stream_json in (False, True):
+        with MockAircallAPI(
+            total_calls=230, max_depth=100, requests_per_minute=60000
+        ) as api:
+            stream = make_tap(api, stream_json=stream_json).streams["calls"]
+            stream.max_pagination_depth = 100
+            stream._write_starting_replication_value(None)
+            synced.append(list(stream.get_records(None)))
+
+    assert [record["id"] for record in synced[1]] == list(range(1, 231))
+    assert synced[0] == synced[1]
+
+
+def test_cut_bodies_are_requested_again(make_tap):
+    """A page whose body is cut mid-transfer is read again, not duplicated."""
+    with MockAircallAPI(
+        total_calls=230, cut_every=3, requests_per_minute=60000
+    ) as api:
+        stream = make_tap(api, stream_json=True).streams["calls"]
+        stream._write_starting_replication_value(None)
+        records = list(stream.get_records(None))
+
+    assert [record["id"] for record in records] == list(range(1, 231))
+    # 5 pages, the 3rd and 6th requests cut
+    assert len(api.requests) == 7
+
+
+def test_cached_pages_are_not_streamed(tmp_path, make_tap):
+    """With a response cache, whole bodies are read and stored."""
+    with MockAircallAPI(total_calls=120, requests_per_minute=60000) as api:
+        tap = make_tap(api, stream_json=True, cache_dir=str(tmp_path))
+        stream = tap.streams["calls"]
+        assert not stream.stream_json
+        stream._write_starting_replication_value(None)
+        assert len(list(stream.get_records(None))) == 120
+
+
+def test_records_key_follows_records_jsonpath(make_tap):
+    """Top-level arrays of records are read by key, other paths by JSONPath."""
+    with MockAircallAPI(total_calls=0) as api:
+        streams = make_tap(api, user_details=True).streams
+    assert streams["calls"].records_key == "calls"
+    assert streams["users"].records_key == "users"
+    assert streams["user"].records_key is None
@@ -0,0 +1,63 @@
+"""Tests for the --metrics-file and --profile options."""
+
+import json
+
+from click.testing import CliRunner
+
+from tap_aircall.metrics import Histogram
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def test_histogram_buckets_by_upper_bound():
+    """A value is counted in the first bucket whose bound is not below it."""
+    histogram = Histogram()
+    for value in (0.001, 0.005, 0.3, 100):
+        histogram.observe(value)
+
+    buckets = histogram.to_dict()["buckets"]
+    assert buckets["0.005"] == 2
+    assert buckets["0.5"] == 1
+    assert buckets["+Inf"] == 1
+    assert histogram.count == 4
+    assert histogram.max == 100
+
+
+def test_metrics_file_and_profile(tmp_path):
+    """The metrics file counts the work of each stream, the profile its stacks."""
+    with MockAircallAPI(
+        total_calls=230, requests_per_minute=60000, latency=0.01
+    ) as api:
+        config = tmp_path / "config.json"
+        config.write_text(json.dumps({
+            "api_id": "id",
+            "api_token": "token",
+            "start_date": "2020-01-01T00:00:00Z",
+            "api_url": api.url,
+            "requests_per_minute": 60000,
+        }))
+        result = CliRunner().invoke(Tapaircall.cli, [
+            "--config", str(config),
+            "--metrics-file", str(tmp_path / "metrics.json"),
+            "--profile", str(tmp_path / "profile.txt"),
+        ])
+        assert result.exit_code == 0, result.output
+        calls_requests = sum(r["path"] == "/v1/calls" for r in api.requests)
+
+    metrics = json.loads((tmp_path / "metrics.json").read_text())
+    calls = metrics["streams"]["calls"]
+    counters = calls["counters"]
+    assert counters["requests"] == counters["pages"] == calls_requests == 5
+    assert counters["records"] == 230
+    assert counters["bytes"] > 0
+    for name in ("parse_seconds", "post_process_seconds", "emit_seconds"):
+        assert counters[name] > 0
+    latency = calls["histograms"]["request_seconds"]
+    assert latency["count"] == 5
+    assert latency["sum"] >= 5 * 0.01
+    assert metrics["streams"]["users"]["counters"]["records"] == 10
+
+    stacks = (tmp_path / "profile.txt").read_text().splitlines()
+    assert stacks
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert any("sync_all" in line for line in stacks)
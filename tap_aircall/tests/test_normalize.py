@@ -0,0 +1,29 @@
+"""Tests for the normalized calls output."""
+
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def test_embedded_objects_written_once(sync):
+    """Calls carry ids only, each embedded object is written before its call."""
+    with MockAircallAPI(total_calls=300, requests_per_minute=60000) as api:
+        messages = sync(api, normalize_calls=True)
+
+    written = {}
+    for message in messages:
+        if message["type"] != "RECORD":
+            continue
+        stream, record = message["stream"], message["record"]
+        if stream != "calls":
+            key = (stream, record["id"])
+            assert written.get(key) != record, "written twice"
+            written[key] = record
+            continue
+        assert "number" not in record and "teams" not in record
+        assert ("numbers", record["number_id"]) in written
+        assert ("contacts", record["contact_id"]) in written
+        assert all(("teams", team_id) in written for team_id in record["team_ids"])
+        assert all(("tags", tag_id) in written for tag_id in record["tag_ids"])
+
+    calls = [m for m in messages if m["type"] == "RECORD" and m["stream"] == "calls"]
+    assert len(calls) == 300
+    assert len(written) < len(calls)
@@ -0,0 +1,58 @@
+"""Tests for the Singer message output helpers."""
+
+import io
+import sys
+import threading
+
+import pytest
+
+from tap_aircall.output import OrderedStdout
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def test_concurrent_messages_do_not_interleave():
+    """Each thread's lines come out whole and in the order they were written."""
+    target = io.StringIO()
+
+    def emit(name):
+        for index in range(200):
+            sys.stdout.write(f'{{"stream": "{name}", ')
+            sys.stdout.write(f'"index": {index}}}\n')
+            sys.stdout.flush()
+
+    with OrderedStdout(target):
+        threads = [threading.Thread(target=emit, args=(n,)) for n in "abc"]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    lines = target.getvalue().splitlines()
+    assert len(lines) == 600
+    for name in "abc":
+        own = [line for line in lines if f'"stream": "{name}"' in line]
+        assert own == [f'{{"stream": "{name}", "index": {i}}}' for i in range(200)]
+    assert sys.stdout is not target
+
+
+def _without_times(messages):
+    for message in messages:
+        message.pop("time_extracted", None)
+        if message["type"] == "STATE":
+            for bookmark in message["value"]["bookmarks"].values():
+                bookmark.pop("replication_key_signpost", None)
+    return messages
+
+
+@pytest.mark.parametrize("backend", ["json", "orjson"])
+def test_record_writer_matches_sdk_output(backend, sync):
+    """The batched writers emit the SDK's messages, STATE after its records."""
+    pytest.importorskip(backend)
+    synced = {}
+    for output_backend in ("sdk", backend):
+        with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+            synced[output_backend] = sync(
+                api, output_backend=output_backend, output_batch_bytes=50000
+            )
+
+    assert _without_times(synced[backend]) == _without_times(synced["sdk"])
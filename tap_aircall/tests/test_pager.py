@@ -0,0 +1,52 @@
+"""Tests for the background page pipeline."""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tap_aircall.pager import PagePipeline
+
+
+def _pages(fetched, count=20, size=100):
+    def fetch():
+        for index in range(count):
+            fetched.append(index)
+            yield SimpleNamespace(index=index, content=b"x" * size)
+
+    return fetch
+
+
+@pytest.mark.parametrize("max_pages,max_bytes", [(2, 10**6), (10, 250)])
+def test_read_ahead_is_bounded(max_pages, max_bytes):
+    """The fetching thread never gets more than the buffer limits ahead."""
+    fetched = []
+    seen = []
+    for page in PagePipeline(_pages(fetched), max_pages, max_bytes):
+        time.sleep(0.002)
+        # buffered pages, plus the one in the caller's hands and the one
+        # waiting to be buffered
+        assert len(fetched) - len(seen) <= min(max_pages, max_bytes // 100) + 2
+        seen.append(page.index)
+    assert seen == list(range(20))
+
+
+def test_errors_reach_the_caller():
+    """An exception raised while fetching is re-raised by the iterator."""
+
+    def fetch():
+        yield SimpleNamespace(content=b"")
+        raise ValueError("bad page")
+
+    with pytest.raises(ValueError, match="bad page"):
+        list(PagePipeline(fetch))
+
+
+def test_closing_early_stops_fetching():
+    """Abandoning the iteration stops the fetching thread."""
+    fetched = []
+    pages = iter(PagePipeline(_pages(fetched, count=1000), max_pages=1))
+    next(pages)
+    pages.close()
+    time.sleep(0.05)
+    assert len(fetched) < 5
@@ -0,0 +1,56 @@
+"""Tests for pagination against the local mock API."""
+
+import pytest
+import singer_sdk.metrics
+
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def test_deep_pagination_restarts_window(make_tap):
+    """Queries restart from the last seen call before the depth cap."""
+    with MockAircallAPI(
+        total_calls=230, max_depth=100, requests_per_minute=60000
+    ) as api:
+        stream = make_tap(api).streams["calls"]
+        stream.max_pagination_depth = 100
+        stream._write_starting_replication_value(None)
+        ids = [record["id"] for record in stream.get_records(None)]
+
+    assert ids == list(range(1, 231))
+    assert all(r["query"].get("page") != ["6"] for r in api.requests)
+
+
+def test_page_size_applies_from_first_request(make_tap):
+    """`per_page` is sent on every request, the API maximum by default."""
+    with MockAircallAPI(total_calls=60, requests_per_minute=60000) as api:
+        for stream in make_tap(api).streams.values():
+            if stream.parent_stream_type:
+                continue
+            stream._write_starting_replication_value(None)
+            list(stream.get_records(None))
+
+    listings = [r for r in api.requests if r["path"] in ("/v1/calls", "/v1/users")]
+    assert [r["query"]["per_page"] for r in listings] == [["50"]] * 3
+
+
+@pytest.mark.parametrize("prefetch_pages", [0, 2])
+def test_requests_are_counted_and_costed(monkeypatch, prefetch_pages, make_tap):
+    """Prefetched pages feed the SDK request counter and sync costs too."""
+    points = []
+    monkeypatch.setattr(
+        singer_sdk.metrics, "log", lambda logger, point: points.append(point)
+    )
+    with MockAircallAPI(total_calls=120, requests_per_minute=60000) as api:
+        tap = make_tap(api, page_size=50, prefetch_pages=prefetch_pages)
+        stream = tap.streams["calls"]
+        stream.calculate_sync_cost = lambda request, response, context: {"rest": 1}
+        records = list(stream.request_records(None))
+
+    counted = sum(
+        point.value
+        for point in points
+        if point.metric == singer_sdk.metrics.Metric.HTTP_REQUEST_COUNT
+    )
+    assert len(records) == 120
+    assert counted == len(api.requests) == 3
+    assert stream._sync_costs == {"rest": 3}
@@ -0,0 +1,106 @@
+"""Tests for the schema-driven record post-processing."""
+
+from tap_aircall.client import (
+    apply_datetime_plan,
+    apply_projection,
+    compile_datetime_plan,
+    compile_projection,
+    unix_to_iso,
+)
+from tap_aircall.schemas import call_properties
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.fixtures import EPOCH, make_call
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def test_call_datetime_plan_reaches_nested_fields():
+    """Top-level and nested date-time properties are part of the plan."""
+    leaves, _, objects, arrays = compile_datetime_plan(call_properties.to_dict())
+    assert {"started_at", "answered_at", "ended_at"} == set(leaves)
+    assert dict(arrays)["comments"][0] == ("posted_at",)
+    assert "user" in dict(objects) and "teams" in dict(arrays)
+    assert compile_datetime_plan({"properties": {"id": {"type": "integer"}}}) is None
+
+
+def test_unix_timestamps_become_iso_utc():
+    """Unix timestamps are converted to UTC, ISO strings are left untouched."""
+    call = make_call(1)
+    apply_datetime_plan(call, compile_datetime_plan(call_properties.to_dict()))
+
+    assert call["started_at"] == "2021-01-01T00:01:00+00:00"
+    assert call["answered_at"] == "2021-01-01T00:01:05+00:00"
+    assert call["comments"][0]["posted_at"] == "2021-01-01T00:04:20+00:00"
+    assert call["user"]["created_at"] == "2020-06-01T09:00:00.000Z"
+    assert call["voicemail"] is None
+    assert unix_to_iso(86399) == "1970-01-01T23:59:59+00:00"
+    assert unix_to_iso(1.5) == "1970-01-01T00:00:01.500000+00:00"
+    assert make_call(1)["started_at"] == EPOCH + 60
+
+
+def _narrow_catalog(selected: list, deselected: dict) -> dict:
+    """Return the tap's catalog with only some properties of calls selected.
+
+    `deselected` maps selected properties to sub-properties to leave out.
+    """
+    catalog = Tapaircall(config={"api_id": "id", "api_token": "token"}).catalog_dict
+    calls = next(stream for stream in catalog["streams"] if stream["stream"] == "calls")
+    for entry in calls["metadata"]:
+        if entry["breadcrumb"]:
+            entry["metadata"]["selected"] = entry["breadcrumb"][1] in selected
+    for key, sub_keys in deselected.items():
+        for sub_key in sub_keys:
+            calls["metadata"].append({
+                "breadcrumb": ["properties", key, "properties", sub_key],
+                "metadata": {"selected": False},
+            })
+    return catalog
+
+
+def test_projection_keeps_selected_properties_only():
+    """Deselected properties are dropped, nested and in arrays of objects."""
+    schema = call_properties.to_dict()
+    mask = {
+        ("properties", "id"): True,
+        ("properties", "user"): True,
+        ("properties", "user", "properties", "id"): True,
+        ("properties", "teams"): True,
+        ("properties", "teams", "properties", "id"): True,
+    }
+    projection = compile_projection(schema, _Mask(mask))
+    call = make_call(1)
+
+    projected = apply_projection(call, projection)
+    assert set(projected) == {"id", "user", "teams"}
+    assert projected["user"] == {"id": call["user"]["id"]}
+    assert projected["teams"] == [{"id": team["id"]} for team in call["teams"]]
+    assert compile_projection(schema, _Mask({}, default=True)) is None
+
+
+class _Mask(dict):
+    def __init__(self, selected: dict, default: bool = False) -> None:
+        super().__init__(selected)
+        self.default = default
+
+    def __missing__(self, breadcrumb: tuple) -> bool:
+        return self.default
+
+
+def test_narrow_catalog_is_projected_before_output(sync):
+    """A narrow catalog gives records of the selected properties only."""
+    catalog = _narrow_catalog(
+        ["id", "started_at", "duration", "number"],
+        {"number": ["direct_link", "users"]},
+    )
+    with MockAircallAPI(total_calls=60, requests_per_minute=60000) as api:
+        messages = sync(api, catalog=catalog)
+
+    calls = [
+        message["record"]
+        for message in messages
+        if message["type"] == "RECORD" and message["stream"] == "calls"
+    ]
+    assert len(calls) == 60
+    for call in calls:
+        assert set(call) == {"id", "started_at", "duration", "number"}
+        assert "direct_link" not in call["number"] and "users" not in call["number"]
+        assert "digits" in call["number"]
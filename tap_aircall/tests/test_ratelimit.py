@@ -0,0 +1,75 @@
+"""Tests for the header-driven rate limiter."""
+
+import time
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from tap_aircall.ratelimit import RateLimiter
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+class FakeClock:
+    """Deterministic clock whose sleep advances time."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_requests_are_spread_over_the_budget():
+    """Sixty requests per minute are sent one second apart."""
+    clock = FakeClock()
+    limiter = RateLimiter(60, clock=clock, sleep=clock.sleep)
+    waits = [limiter.acquire() for _ in range(4)]
+    assert waits == [0, 1, 1, 1]
+    assert limiter.wait_seconds == 3
+
+
+def test_low_remaining_budget_slows_down():
+    """A nearly spent budget widens the interval until the reset."""
+    limiter = RateLimiter(60)
+    limiter.update(
+        {
+            "X-AircallApi-Remaining": "5",
+            "X-AircallApi-Reset": str(time.time() + 30),
+        }
+    )
+    assert 5.5 < limiter.interval <= 6
+
+
+def test_configured_budget_is_a_ceiling():
+    """A higher limit from the API does not raise the configured budget."""
+    limiter = RateLimiter(60)
+    limiter.update({"X-AircallApi-Limit": "600"})
+    assert limiter.interval == 1
+    limiter.update({"X-AircallApi-Limit": "30"})
+    assert limiter.interval == 2
+
+
+def test_throttled_requests_wait_until_reset_only():
+    """After a 429 the limiter sleeps until the reset, not a flat 90 seconds."""
+    limiter = RateLimiter(6000)
+    statuses = []
+    with MockAircallAPI(
+        throttle_every=2, throttle_seconds=0.5, requests_per_minute=6000
+    ) as api:
+        started = time.monotonic()
+        for _ in range(4):
+            limiter.acquire()
+            try:
+                with urlopen(f"{api.url}v1/users") as response:
+                    status, headers = response.status, response.headers
+            except HTTPError as error:
+                status, headers = error.code, error.headers
+            limiter.update(headers, status)
+            statuses.append(status)
+        elapsed = time.monotonic() - started
+
+    assert statuses == [200, 429, 200, 429]
+    assert 0.4 < limiter.wait_seconds < 1
+    assert elapsed < 2
@@ -0,0 +1,33 @@
+"""Tests for the fast-start CLI and the packaged schemas."""
+
+import subprocess
+import sys
+
+import pytest
+
+from tap_aircall import cli
+from tap_aircall.schemas import SCHEMA_FILES, SCHEMAS_DIR, render_schema
+from tap_aircall.tap import Tapaircall
+
+
+@pytest.mark.parametrize("name", sorted(SCHEMA_FILES))
+def test_schema_files_are_up_to_date(name):
+    """The packaged files match `schemas.py`, see `python -m tap_aircall.schemas`."""
+    assert (SCHEMAS_DIR / name).read_text(encoding="utf-8") == render_schema(name)
+
+
+def test_version_matches_the_sdk(capsys):
+    """`--version` prints what `Tapaircall.print_version` would."""
+    cli.main(["--version"])
+    Tapaircall.print_version()
+    fast, sdk = capsys.readouterr().out.splitlines()
+    assert fast == sdk
+
+
+def test_tap_does_not_build_the_schemas():
+    """Loading the tap leaves `schemas.py` and its PropertiesLists alone."""
+    code = "import sys, tap_aircall.tap; print('tap_aircall.schemas' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
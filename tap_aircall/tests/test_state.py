@@ -0,0 +1,293 @@
+"""Tests for bookmarks and resumable checkpoints."""
+
+import copy
+import gzip
+import json
+import types
+from urllib.parse import urlparse
+
+import pytest
+from singer_sdk.exceptions import ConfigValidationError
+
+from tap_aircall import streams
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.fixtures import EPOCH
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def test_interrupted_sync_resumes_from_checkpoint(sync):
+    """A restart from a checkpoint STATE neither skips nor repeats calls."""
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        messages = sync(api, checkpoint_records=40)
+        # pretend the run died right after the third checkpoint
+        checkpoints = [
+            index
+            for index, message in enumerate(messages)
+            if message["type"] == "STATE"
+            and "checkpoint" in message["value"]["bookmarks"].get("calls", {})
+        ]
+        crash = checkpoints[2]
+        emitted = [
+            message["record"]["id"]
+            for message in messages[:crash]
+            if message["type"] == "RECORD" and message["stream"] == "calls"
+        ]
+        state = messages[crash]["value"]
+
+        api.requests.clear()
+        resumed = [
+            message["record"]["id"]
+            for message in sync(api, state=state, checkpoint_records=40)
+            if message["type"] == "RECORD" and message["stream"] == "calls"
+        ]
+
+    assert state["bookmarks"]["calls"]["checkpoint"]["records"] == 120
+    assert emitted + resumed == list(range(1, 231))
+    assert "checkpoint" not in messages[-1]["value"]["bookmarks"]["calls"]
+
+
+def _is_call(message: dict) -> bool:
+    return message["type"] == "RECORD" and message["stream"] == "calls"
+
+
+def test_lookback_emits_only_changed_calls(sync):
+    """Calls re-read within `lookback_days` are emitted again only if edited."""
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        messages = sync(api, lookback_days=0.05)
+        first = [m["record"]["id"] for m in messages if _is_call(m)]
+        state = messages[-1]["value"]
+
+        api.requests.clear()
+        api.updates[200] = {"archived": True, "tags": []}
+        resumed = sync(api, state=state, lookback_days=0.05)
+
+    calls = [m["record"] for m in resumed if _is_call(m)]
+    bookmark = resumed[-1]["value"]["bookmarks"]["calls"]
+    index = bookmark["content_hashes"]
+    assert first == list(range(1, 231))
+    assert [call["id"] for call in calls] == [200]
+    assert calls[0]["archived"] is True
+    # 0.05 days = 72 minutes before the last call, one call per minute
+    first_call = api.requests[0]["query"]["from"][0]
+    assert float(first_call) == pytest.approx(1609459200 + 230 * 60 - 72 * 60)
+    assert sorted(map(int, index)) == list(range(158, 231))
+    # the bookmark stays at the last call, not at the last edited one
+    last_call = state["bookmarks"]["calls"]["replication_key_value"]
+    assert bookmark["replication_key_value"] == last_call
+    assert last_call.startswith("2021-01-01T03:50")
+
+
+def test_lookback_index_stays_the_size_of_the_lookback(sync):
+    """The `content_hashes` of every STATE only hold calls of the lookback."""
+    with MockAircallAPI(total_calls=1000, requests_per_minute=60000) as api:
+        messages = sync(api, lookback_days=0.05, checkpoint_records=50)
+
+    sizes = [
+        len(message["value"]["bookmarks"]["calls"].get("content_hashes", {}))
+        for message in messages
+        if message["type"] == "STATE" and "calls" in message["value"]["bookmarks"]
+    ]
+    assert len(sizes) > 10
+    # 73 calls in 0.05 days, compacted once doubled
+    assert max(sizes) <= 2 * 73
+    assert sizes[-1] == 73
+
+
+HOURLY = {"window_days": 1 / 24, "start_date": "2021-01-01T00:00:00Z"}
+
+
+def _now(monkeypatch, unix_time: float) -> None:
+    """Make the streams see `unix_time` as the current time."""
+    monkeypatch.setattr(
+        streams, "time", types.SimpleNamespace(time=lambda: unix_time)
+    )
+
+
+def _call_starts(api: MockAircallAPI) -> list:
+    """Return the `from` of the first request of each calls query."""
+    return sorted(
+        float(request["query"]["from"][0])
+        for request in api.requests
+        if request["path"] == "/v1/calls" and "page" not in request["query"]
+    )
+
+
+def test_interrupted_window_resumes_at_its_checkpoint(monkeypatch, sync):
+    """A run stopped mid-window resumes that window, not the completed ones."""
+    _now(monkeypatch, EPOCH + 4 * 3600)
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        messages = sync(api, checkpoint_records=20, **HOURLY)
+        # pretend the run died at the last checkpoint of the third window
+        crash, checkpoint = [
+            (i, partition["checkpoint"])
+            for i, message in enumerate(messages)
+            if message["type"] == "STATE"
+            for partition in message["value"]["bookmarks"]["calls"]["partitions"]
+            if partition["context"]["from"] == EPOCH + 2 * 3600
+            and "checkpoint" in partition
+        ][-1]
+        state = messages[crash]["value"]
+        api.requests.clear()
+        resumed = sync(api, state=state, checkpoint_records=20, **HOURLY)
+
+    emitted = [m["record"]["id"] for m in messages[:crash] if _is_call(m)]
+    emitted += [m["record"]["id"] for m in resumed if _is_call(m)]
+    assert emitted == list(range(1, 231))
+    # the window resumes at its checkpoint, the completed ones are skipped
+    last_id = 119 + checkpoint["records"]
+    assert checkpoint["ids"] == [last_id]
+    assert _call_starts(api) == [EPOCH + last_id * 60, EPOCH + 3 * 3600]
+    calls_state = resumed[-1]["value"]["bookmarks"]["calls"]
+    assert calls_state["windows_from"] == EPOCH + 4 * 3600
+    assert calls_state["partitions"] == []
+
+
+def test_windows_resume_at_their_bookmark(monkeypatch, sync):
+    """The next run starts at the open window, from its own bookmark."""
+    _now(monkeypatch, EPOCH + 2.5 * 3600)
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        messages = sync(api, **HOURLY)
+        state = messages[-1]["value"]
+        calls_state = copy.deepcopy(state["bookmarks"]["calls"])
+        _now(monkeypatch, EPOCH + 4 * 3600)
+        api.requests.clear()
+        resumed = sync(api, state=state, **HOURLY)
+
+    assert calls_state["windows_from"] == EPOCH + 2 * 3600
+    assert [p["context"]["from"] for p in calls_state["partitions"]] == [
+        EPOCH + 2 * 3600
+    ]
+    # calls up to 02:29, the window ending at 03:00 is still open
+    assert [m["record"]["id"] for m in messages if _is_call(m)] == list(range(1, 150))
+    # it restarts at its last call, written again
+    assert _call_starts(api) == [EPOCH + 149 * 60, EPOCH + 3 * 3600]
+    assert [m["record"]["id"] for m in resumed if _is_call(m)] == list(range(149, 231))
+
+
+def _selected(*names: str) -> dict:
+    """Return the tap's catalog with only the `names` streams selected."""
+    catalog = Tapaircall(config={"api_id": "id", "api_token": "token"}).catalog_dict
+    for stream in catalog["streams"]:
+        for entry in stream["metadata"]:
+            if not entry["breadcrumb"]:
+                entry["metadata"]["selected"] = stream["stream"] in names
+    return catalog
+
+
+def test_last_state_holds_the_complete_windows(monkeypatch, sync):
+    """Synced alone, calls still write the `windows_from` of their last run."""
+    _now(monkeypatch, EPOCH + 2.5 * 3600)
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        messages = sync(api, catalog=_selected("calls"), **HOURLY)
+
+    assert {m["stream"] for m in messages if "stream" in m} == {"calls"}
+    calls_state = messages[-1]["value"]["bookmarks"]["calls"]
+    assert calls_state["windows_from"] == EPOCH + 2 * 3600
+    assert [p["context"]["from"] for p in calls_state["partitions"]] == [
+        EPOCH + 2 * 3600
+    ]
+
+
+def test_prefetched_windows_start_at_their_bookmark(monkeypatch, sync):
+    """Windows fetched ahead of their turn also start at their bookmark."""
+    _now(monkeypatch, EPOCH + 4 * 3600)
+    state = {"bookmarks": {"calls": {
+        "windows_from": EPOCH + 2 * 3600,
+        "partitions": [
+            {
+                "context": {"from": EPOCH + 2 * 3600, "to": EPOCH + 3 * 3600},
+                "checkpoint": {
+                    "replication_key_value": "2021-01-01T02:19:00+00:00",
+                    "ids": [139],
+                    "records": 20,
+                },
+            },
+            {
+                "context": {"from": EPOCH + 3 * 3600, "to": EPOCH + 4 * 3600},
+                "replication_key": "started_at",
+                "replication_key_value": "2021-01-01T03:20:00+00:00",
+            },
+        ],
+    }}}
+    with MockAircallAPI(total_calls=230, requests_per_minute=60000) as api:
+        resumed = sync(api, state=state, **HOURLY)
+
+    assert _call_starts(api) == [EPOCH + 139 * 60, EPOCH + 200 * 60]
+    ids = [m["record"]["id"] for m in resumed if _is_call(m)]
+    assert ids == list(range(140, 180)) + list(range(200, 231))
+
+
+def test_windows_require_a_start(sync):
+    """Without a start_date or state there is no first window."""
+    with MockAircallAPI(requests_per_minute=60000) as api:
+        with pytest.raises(ConfigValidationError, match="window_days"):
+            sync(api, window_days=1, start_date=None)
+
+
+def test_concurrent_streams_write_every_record_and_state(sync):
+    """Streams synced in parallel write all their records, then the last STATE."""
+    with MockAircallAPI(
+        total_calls=230, total_users=40, requests_per_minute=60000
+    ) as api:
+        serial = sync(api)
+        concurrent = sync(api, concurrent_streams=True)
+
+    def ids(messages: list, stream: str) -> list:
+        return [
+            m["record"]["id"]
+            for m in messages
+            if m["type"] == "RECORD" and m["stream"] == stream
+        ]
+
+    assert ids(concurrent, "calls") == list(range(1, 231))
+    assert ids(concurrent, "users") == list(range(1, 41))
+    assert concurrent[-1]["type"] == "STATE"
+    assert concurrent[-1]["value"] == serial[-1]["value"]
+    assert set(concurrent[-1]["value"]["bookmarks"]) == {"calls", "users"}
+
+
+def _calls(messages: list) -> list:
+    """Return the calls of RECORD messages, and of the batch files announced."""
+    calls = []
+    for message in messages:
+        if _is_call(message):
+            calls.append(message["record"])
+        elif message["type"] == "BATCH" and message["stream"] == "calls":
+            for url in message["manifest"]:
+                with gzip.open(urlparse(url).path) as lines:
+                    calls += [json.loads(line) for line in lines]
+    return calls
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_accounts_sync_into_their_own_state(tmp_path, batched, sync):
+    """Each of `accounts` is synced with its credentials, tagged and bookmarked."""
+    accounts = [
+        {"key": "north", "api_id": "north-id", "api_token": "north-token"},
+        {"key": "south", "api_id": "south-id", "api_token": "south-token"},
+    ]
+    config = {"batch_dir": str(tmp_path)} if batched else {}
+    with MockAircallAPI(total_calls=60, requests_per_minute=60000) as api:
+        messages = sync(api, accounts=accounts, **config)
+        authorizations = {request["authorization"] for request in api.requests}
+        state = messages[-1]["value"]
+
+        api.requests.clear()
+        sync(api, state=state, accounts=accounts, **config)
+        resumed_from = {
+            float(request["query"]["from"][0])
+            for request in api.requests
+            if request["path"] == "/v1/calls"
+        }
+
+    schema = next(
+        m for m in messages if m["type"] == "SCHEMA" and m["stream"] == "calls"
+    )
+    calls = _calls(messages)
+    assert schema["key_properties"] == ["account", "id"]
+    assert len(authorizations) == 2
+    for key in ("north", "south"):
+        assert [c["id"] for c in calls if c["account"] == key] == list(range(1, 61))
+        bookmark = state["accounts"][key]["bookmarks"]["calls"]
+        assert bookmark["replication_key_value"] == "2021-01-01T01:00:00+00:00"
+    assert resumed_from == {1609459200 + 60 * 60}
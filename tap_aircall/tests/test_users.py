@@ -0,0 +1,47 @@
+"""Tests for the per-user detail stream."""
+
+import time
+
+from tap_aircall.tests.mock_api import MockAircallAPI
+
+
+def _detail_requests(api: MockAircallAPI) -> int:
+    return sum(request["path"].count("/") == 3 for request in api.requests)
+
+
+def test_user_details_fetched_concurrently_in_order(sync):
+    """Details come back in listing order, and unchanged users are skipped."""
+    with MockAircallAPI(
+        total_calls=0, total_users=40, latency=0.05, requests_per_minute=60000
+    ) as api:
+        started = time.monotonic()
+        messages = sync(api, user_details=True, user_workers=8)
+        elapsed = time.monotonic() - started
+        assert _detail_requests(api) == 40
+
+        state = [m for m in messages if m["type"] == "STATE"][-1]["value"]
+        # the listing is requested again from the start
+        state["bookmarks"].pop("users")
+        api.requests.clear()
+        again = sync(
+            api, state=state, user_details=True, user_workers=8
+        )
+
+    details = [
+        m["record"]["id"]
+        for m in messages
+        if m["type"] == "RECORD" and m["stream"] == "user"
+    ]
+    assert details == list(range(1, 41))
+    # 40 sequential requests would take at least 2 seconds
+    assert elapsed < 1.5
+    assert _detail_requests(api) == 0
+    assert not any(m["type"] == "RECORD" and m["stream"] == "user" for m in again)
+
+
+def test_user_details_are_opt_in(sync):
+    """Without `user_details`, users are listed and no detail is requested."""
+    with MockAircallAPI(total_calls=0, total_users=5) as api:
+        messages = sync(api)
+        assert _detail_requests(api) == 0
+    assert not any(m.get("stream") == "user" for m in messages)
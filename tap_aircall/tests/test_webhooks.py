@@ -0,0 +1,113 @@
+"""Tests for the webhook receiver mode."""
+
+import contextlib
+import io
+import json
+import socket
+import threading
+from typing import Tuple
+
+from tap_aircall.schemas import call_properties, user_properties
+from tap_aircall.tap import Tapaircall
+from tap_aircall.tests.fixtures import EPOCH, RecordFactory
+from tap_aircall.webhooks import WebhookServer, replay_events
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _event(resource: str, data: dict, token: str = "secret") -> dict:
+    return {
+        "resource": resource,
+        "event": f"{resource}.created",
+        "timestamp": EPOCH,
+        "token": token,
+        "data": data,
+    }
+
+
+def _listen(tap: Tapaircall, port: int, events: list) -> Tuple[list, list]:
+    """Post the events to a listening tap, returning the statuses and messages."""
+    stop = threading.Event()
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        listener = threading.Thread(target=tap.listen_webhooks, args=(stop,))
+        listener.start()
+        for _ in range(50):
+            with contextlib.suppress(OSError):
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            stop.wait(0.05)
+        statuses = replay_events(f"http://127.0.0.1:{port}/", events)
+        stop.set()
+        listener.join(timeout=10)
+    return statuses, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+def test_webhook_events_are_written_as_records():
+    """Authentic events become records, followed by a STATE with the bookmark."""
+    port = _free_port()
+    tap = Tapaircall(
+        config={
+            "api_id": "id",
+            "api_token": "token",
+            "webhook_tokens": ["other", "secret"],
+            "webhook_port": port,
+            "webhook_flush_seconds": 0.1,
+        },
+        parse_env_config=False,
+    )
+    calls = RecordFactory(call_properties.to_dict()).record
+    users = RecordFactory(user_properties.to_dict()).record
+    events = [
+        _event("call", calls(7)),
+        _event("call", calls(3)),
+        _event("user", users(1)),
+        _event("call", calls(8), token="forged"),
+        _event("company", {"id": 1}),
+    ]
+    statuses, messages = _listen(tap, port, events)
+
+    records = [(m["stream"], m["record"]) for m in messages if m["type"] == "RECORD"]
+    assert statuses == [200, 200, 200, 401, 200]
+    assert [(stream, record["id"]) for stream, record in records] == [
+        ("calls", 7),
+        ("calls", 3),
+        ("users", 1),
+    ]
+    # date-times are converted like those of synced records
+    assert records[0][1]["started_at"] == "2021-01-01T00:07:00+00:00"
+    assert messages[-1]["type"] == "STATE"
+    bookmark = messages[-1]["value"]["bookmarks"]["calls"]
+    assert bookmark["replication_key_value"] == "2021-01-01T00:07:00+00:00"
+
+
+def test_queued_events_are_kept_in_the_state():
+    """Events acknowledged but not written yet are in the STATE, then replayed."""
+    calls = RecordFactory(call_properties.to_dict()).record
+    config = {"api_id": "id", "api_token": "token", "webhook_tokens": ["secret"]}
+    tap = Tapaircall(config=config, parse_env_config=False)
+    streams = {"call": tap.streams["calls"]}
+    stdout = io.StringIO()
+    with WebhookServer(["secret"]) as server, contextlib.redirect_stdout(stdout):
+        # acknowledged while the previous micro-batch is being written
+        replay_events(server.url, [_event("call", calls(4)), _event("call", calls(5))])
+        tap._write_webhook_events([_event("call", calls(3))], streams, server)
+    state = json.loads(stdout.getvalue().splitlines()[-1])["value"]
+    pending = state["webhooks"]["pending"]
+    assert [event["data"]["id"] for event in pending] == [4, 5]
+    assert "token" not in pending[0]
+
+    port = _free_port()
+    resumed = Tapaircall(
+        config={**config, "webhook_port": port, "webhook_flush_seconds": 0.1},
+        state=state,
+        parse_env_config=False,
+    )
+    _, messages = _listen(resumed, port, [_event("call", calls(6))])
+    records = [m["record"]["id"] for m in messages if m["type"] == "RECORD"]
+    assert records == [4, 5, 6]
+    assert messages[-1]["value"]["webhooks"] == {"pending": []}
@@ -0,0 +1,55 @@
+"""Tests for the time-window partitioning helpers."""
+
+import random
+import time
+
+import pytest
+
+from tap_aircall.windows import PartitionPrefetcher, time_windows
+
+
+def test_time_windows_are_aligned_on_start():
+    """Windows cover the range and keep their boundaries from run to run."""
+    assert time_windows(0, 25, 10) == [
+        {"from": 0, "to": 10},
+        {"from": 10, "to": 20},
+        {"from": 20, "to": 30},
+    ]
+    assert time_windows(0, 30, 10) == time_windows(0, 21, 10)
+    assert time_windows(10, 10, 10) == []
+
+
+def test_prefetcher_replays_partitions_in_submission_order():
+    """Records come back in partition order whatever the worker timing."""
+
+    def fetch(context):
+        for index in range(5):
+            time.sleep(random.random() / 1000)
+            yield {"from": context["from"], "index": index}
+
+    windows = time_windows(0, 100, 10)
+    prefetcher = PartitionPrefetcher(fetch, max_workers=3, buffer_size=2)
+    prefetcher.submit(windows)
+    records = [r for window in windows for r in prefetcher.records(window)]
+
+    assert records == [
+        {"from": window["from"], "index": index}
+        for window in windows
+        for index in range(5)
+    ]
+    assert prefetcher.pending == 0
+    prefetcher.close()
+
+
+def test_prefetcher_reraises_worker_errors():
+    """A failing window surfaces its exception to the consumer."""
+
+    def fetch(context):
+        yield {"from": context["from"]}
+        raise RuntimeError("boom")
+
+    prefetcher = PartitionPrefetcher(fetch, max_workers=2)
+    window = {"from": 0, "to": 10}
+    prefetcher.submit([window])
+    with pytest.raises(RuntimeError, match="boom"):
+        list(prefetcher.records(window))
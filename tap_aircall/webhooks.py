@@ -0,0 +1,175 @@
+"""Receiver of Aircall webhook events, and a replayer to test it locally.
+
+Aircall POSTs one JSON event per request to the webhook URL::
+
+    {"resource": "call", "event": "call.ended", "timestamp": 1585001000,
+     "token": "45XXYYZZa08", "data": {...}}
+
+where `data` is the object as the REST API returns it and `token` identifies
+the webhook it was sent by. Recorded events can be posted again with::
+
+    python -m tap_aircall.webhooks events.jsonl --url http://127.0.0.1:8080/
+"""
+
+import argparse
+import hmac
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Sequence
+
+import requests
+
+
+class WebhookServer:
+    """Accept webhook events over HTTP and queue the authentic ones.
+
+    Use as a context manager; `url` is then the URL to register in Aircall.
+    An event is answered with 200 once queued, 401 if its token is not one of
+    `tokens`, and 400 if it is not a JSON object. At most `max_events` events
+    wait in the queue: when they are not consumed fast enough, responses are
+    delayed and Aircall slows down or retries.
+    """
+
+    def __init__(
+        self,
+        tokens: Sequence[str],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        max_events: int = 10000,
+    ) -> None:
+        """Configure the address to listen on and the accepted tokens."""
+        if not tokens:
+            raise ValueError("At least one webhook token is needed.")
+        self.tokens = [str(token) for token in tokens]
+        self.host = host
+        self.port = port
+        self.received = 0
+        self.rejected = 0
+        self._events: queue.Queue = queue.Queue(maxsize=max_events)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        """Return the URL of the running server."""
+        assert self._server is not None, "The webhook server is not running."
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def __enter__(self) -> "WebhookServer":
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:  # noqa: N802
+                receiver._handle(self)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        assert self._server is not None
+        self._server.shutdown()
+        self._server.server_close()
+
+    def authentic(self, event: dict) -> bool:
+        """Return True if the event carries one of the accepted tokens."""
+        token = str(event.get("token") or "")
+        return any(hmac.compare_digest(token, accepted) for accepted in self.tokens)
+
+    def batch(self, seconds: float) -> List[dict]:
+        """Return the events received within the next `seconds`, in order."""
+        deadline = time.monotonic() + seconds
+        events = []
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return events
+            try:
+                events.append(self._events.get(timeout=timeout))
+            except queue.Empty:
+                return events
+
+    def pending(self) -> List[dict]:
+        """Return the events queued and not consumed yet, leaving them queued."""
+        with self._events.mutex:
+            return list(self._events.queue)
+
+    def drain(self) -> List[dict]:
+        """Return the events queued and not consumed yet, in order."""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        length = int(handler.headers.get("Content-Length") or 0)
+        try:
+            event = json.loads(handler.rfile.read(length))
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            status = 400
+        elif not self.authentic(event):
+            status = 401
+        else:
+            self._events.put(event)
+            status = 200
+        with self._lock:
+            if status == 200:
+                self.received += 1
+            else:
+                self.rejected += 1
+
+        payload = json.dumps({"status": "ok" if status == 200 else "refused"})
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload.encode("utf-8"))
+
+
+def replay_events(
+    url: str, events: Iterable[dict], interval: float = 0.0
+) -> List[int]:
+    """POST the events to a webhook URL in order, returning the status codes."""
+    statuses = []
+    with requests.Session() as session:
+        for event in events:
+            statuses.append(session.post(url, json=event, timeout=10).status_code)
+            if interval:
+                time.sleep(interval)
+    return statuses
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """Replay a JSONL file of webhook events."""
+    parser = argparse.ArgumentParser(description="Replay Aircall webhook events.")
+    parser.add_argument("events", type=Path, help="JSONL file, one event per line.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/")
+    parser.add_argument(
+        "--interval", type=float, default=0.0, help="Seconds between events."
+    )
+    args = parser.parse_args(argv)
+
+    with args.events.open() as lines:
+        events = (json.loads(line) for line in lines if line.strip())
+        statuses = replay_events(args.url, events, args.interval)
+    refused = sum(status != 200 for status in statuses)
+    print(f"{len(statuses)} events replayed, {refused} refused.")
+
+
+if __name__ == "__main__":
+    main()